@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gptcode1 import list_augmentation_jobs, process_videos, seq
+
+def make_videos(base_path, gestures=('he', 'she', 'clean', 'dirty'), videos=2, frames=90, size=(640, 480)):
+    """ Write synthetic clips in the <gesture>/<video> layout process_videos() reads. """
+    width, height = size
+    rng = np.random.default_rng(0)
+    for gesture in gestures:
+        os.makedirs(os.path.join(base_path, gesture), exist_ok=True)
+        for v in range(videos):
+            writer = cv2.VideoWriter(os.path.join(base_path, gesture, f'video{v}.avi'),
+                                     cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+            background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+            for f in range(frames):
+                frame = background.copy()
+                cv2.circle(frame, (int(width * f / frames), height // 2), 60, (140, 170, 220), -1)
+                writer.write(frame)
+            writer.release()
+
+def per_frame_loop(base_path, output_path):
+    """ The old process_videos(): one seq() call per frame, a new random transform every frame. """
+    frames = 0
+    for video_path, save_prefix, *_ in list_augmentation_jobs(base_path, output_path):
+        cap = cv2.VideoCapture(video_path)
+        frame_count = 0
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_count += 1
+            frame = cv2.resize(frame, (224, 224))
+            images_aug = seq(images=[frame])
+            cv2.imwrite(f"{save_prefix}_{frame_count}.png", images_aug[0])
+        cap.release()
+        frames += frame_count
+    return frames
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-frame and batched per-clip video augmentation.")
+    parser.add_argument('--videos', type=int, default=2, help="synthetic videos per gesture")
+    parser.add_argument('--frames', type=int, default=90, help="frames per synthetic video")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_augmentation_')
+    try:
+        base_path = os.path.join(workdir, 'videos')
+        make_videos(base_path, videos=args.videos, frames=args.frames)
+
+        runs = [
+            ('per-frame seq() loop', lambda out: per_frame_loop(base_path, out)),
+            ('batched, 1 process', lambda out: process_videos(base_path, out, batch_size=args.batch_size)),
+            (f'batched, {args.workers} processes',
+             lambda out: process_videos(base_path, out, workers=args.workers, batch_size=args.batch_size)),
+        ]
+        baseline = None
+        for name, run in runs:
+            output_path = os.path.join(workdir, name.replace(' ', '_').replace(',', ''))
+            os.makedirs(output_path)
+            start = time.perf_counter()
+            frames = run(output_path)
+            fps = frames / (time.perf_counter() - start)
+            baseline = baseline or fps
+            print(f"{name:28s} {frames} frames  {fps:8.1f} frames/s  ({fps / baseline:.1f}x)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
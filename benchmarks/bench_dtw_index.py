@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataPreProcessing'))
+from dtw_index import DTWIndex, dtw_batch
+
+DATASETS = ('generic', 'smooth')
+
+def make_features(kind, classes, templates, queries, length=32, dims=86, noise=0.1, seed=0):
+    """ (templates, labels, queries, query labels) of synthetic [length, dims] feature sequences.
+
+    'generic': every class is a uniform random [length, dims] prototype, so frames change
+    arbitrarily from one to the next, plus gaussian noise of sigma `noise` per value.
+    'smooth': every class is a random walk, closer to hand landmarks moving over time,
+    with the same noise.
+    """
+    rng = np.random.default_rng(seed)
+    if kind == 'generic':
+        prototypes = rng.random((classes, length, dims))
+    else:
+        prototypes = rng.random((classes, 1, dims)) + np.cumsum(rng.normal(0, 0.05, (classes, length, dims)), axis=1)
+    labels = rng.integers(0, classes, templates + queries)
+    features = prototypes[labels] + rng.normal(0, noise, (len(labels), length, dims))
+    features = features.astype(np.float32)
+    return features[:templates], labels[:templates], features[templates:], labels[templates:]
+
+def run(kind, classes, templates, queries, brute_force_queries, seed):
+    """ Query timings and pruning of one synthetic index, checked against brute-force DTW. """
+    features, labels, query_features, _ = make_features(kind, classes, templates, queries, seed=seed)
+    index = DTWIndex()
+    index.add_features(features, labels)
+    timings = []
+    nearest = []
+    for query in query_features:
+        start = time.perf_counter()
+        nearest.append(index.query_features(query)[0][0])
+        timings.append((time.perf_counter() - start) * 1000)
+
+    brute_timings = []
+    exact = True
+    for query, distance in list(zip(query_features, nearest))[:brute_force_queries]:
+        start = time.perf_counter()
+        expected = dtw_batch(query, index.templates[:index.count], index.radius).min()
+        brute_timings.append((time.perf_counter() - start) * 1000)
+        exact = exact and abs(distance - expected) <= 1e-4 * expected
+    per_query = {name: value / queries for name, value in index.stats.items() if name != 'queries'}
+    return {'dataset': kind, 'templates': templates, 'classes': classes, 'query_p50_ms': float(np.median(timings)),
+            'query_p95_ms': float(np.percentile(timings, 95)), 'brute_force_ms': float(np.median(brute_timings)),
+            'exact': bool(exact), 'per_query': per_query}
+
+def main():
+    parser = argparse.ArgumentParser(description="Query time of the DTW template index against the number of templates.")
+    parser.add_argument('--templates', type=int, nargs='+', default=[500, 1000, 2000, 4000, 8000])
+    parser.add_argument('--templates-per-class', type=int, default=40)
+    parser.add_argument('--queries', type=int, default=30)
+    parser.add_argument('--brute-force-queries', type=int, default=3, help="queries also run against every template")
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=list(DATASETS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_dtw_index.json', help="JSON file for the results")
+    args = parser.parse_args()
+
+    report = []
+    for kind in args.datasets:
+        for templates in args.templates:
+            classes = max(1, templates // args.templates_per_class)
+            result = run(kind, classes, templates, args.queries, args.brute_force_queries, args.seed)
+            report.append(result)
+            pruned = result['per_query']
+            print(f"{kind:8s} {templates:6d} templates: query p50 {result['query_p50_ms']:7.2f} ms, "
+                  f"p95 {result['query_p95_ms']:7.2f} ms, brute force {result['brute_force_ms']:8.1f} ms, "
+                  f"{pruned['dtw']:6.1f} DTWs/query (pruned {pruned['pruned_cluster_bound']:.0f} cluster, "
+                  f"{pruned['pruned_segment_bound']:.0f} segment, "
+                  f"{pruned['pruned_projected_bound']:.0f} projected, {pruned['pruned_band_bound']:.0f} band), "
+                  f"exact: {result['exact']}")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataPreProcessing'))
+from bench_pipeline import make_synthetic_videos
+from video_keypoints import create_hands, extract_video_keypoints, list_videos
+
+def run(videos, hands, inference):
+    """ Extract every video with the given InferenceInput options. Returns (results, frames/s, inference ms/frame). """
+    results = []
+    start = time.perf_counter()
+    for video_path in videos:
+        results.append(extract_video_keypoints(video_path, hands, inference=inference))
+    elapsed = time.perf_counter() - start
+    frames = sum(len(result['mask']) for result in results)
+    inference_ms = sum(float(result['inference_ms']) for result in results)
+    return results, frames / elapsed, inference_ms / max(frames, 1)
+
+def compare(reference, results, size):
+    """ Hand detection agreement and mean landmark distance in pixels against the full-resolution run. """
+    width, height = size
+    agree = total = 0
+    errors = []
+    for ref, res in zip(reference, results):
+        agree += int((ref['mask'] == res['mask']).sum())
+        total += ref['mask'].size
+        both = ref['mask'] & res['mask']
+        delta = (ref['keypoints'][both] - res['keypoints'][both])[..., :2] * (width, height)
+        errors.append(np.linalg.norm(delta, axis=-1).ravel())
+    errors = np.concatenate(errors) if errors else np.zeros(0)
+    return agree / max(total, 1), float(errors.mean()) if len(errors) else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and throughput of Mediapipe at reduced inference sizes.")
+    parser.add_argument('--dataset', help="videos/ folder, synthetic videos are generated if omitted")
+    parser.add_argument('--sizes', default='640,480,320,256', help="comma separated max inference sizes")
+    parser.add_argument('--frames', type=int, default=60, help="frames per synthetic video")
+    parser.add_argument('--videos', type=int, default=2, help="synthetic videos per gesture")
+    parser.add_argument('--output', default='bench_inference_size.json', help="JSON file for the results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_inference_size_')
+    try:
+        dataset_folder = args.dataset
+        if dataset_folder is None:
+            dataset_folder = os.path.join(workdir, 'videos')
+            make_synthetic_videos(dataset_folder, videos=args.videos, frames=args.frames)
+        videos = [video_path for category, gesture, video_path in list_videos(dataset_folder)]
+        cap = cv2.VideoCapture(videos[0])
+        frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+        hands = create_hands()
+        reference, reference_fps, reference_ms = run(videos, hands, None)
+        report = {'frame_size': frame_size, 'runs': [{'name': 'full', 'frames_per_s': reference_fps,
+                                                       'inference_ms': reference_ms, 'detection_agreement': 1.0,
+                                                       'landmark_error_px': 0.0}]}
+        for size in (int(size) for size in args.sizes.split(',')):
+            for crop in (False, True):
+                name = f"{size}{' crop' if crop else ''}"
+                results, fps, inference_ms = run(videos, hands, {'max_size': size, 'crop': crop})
+                agreement, error = compare(reference, results, frame_size)
+                report['runs'].append({'name': name, 'frames_per_s': fps, 'inference_ms': inference_ms,
+                                       'detection_agreement': agreement, 'landmark_error_px': error})
+        hands.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"frames of {frame_size[0]}x{frame_size[1]}")
+    for run_report in report['runs']:
+        print(f"  {run_report['name']:10s} {run_report['frames_per_s']:8.1f} frames/s  "
+              f"inference {run_report['inference_ms']:6.2f} ms  "
+              f"detection agreement {100 * run_report['detection_agreement']:5.1f}%  "
+              f"landmark error {run_report['landmark_error_px']:6.2f} px")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataPreProcessing'))
+from normalization import normalize_hands
+
+def normalize_keypoints_loop(keypoints):
+    """ The per-hand loop normalize_keypoints() used before normalize_hands(), kept as the reference. """
+    normalized_keypoints = []
+    for points in keypoints:
+        points_array = np.array(points)
+        for i in range(3):  # for x, y, z
+            min_val = points_array[:, i].min()
+            max_val = points_array[:, i].max()
+            if max_val - min_val > 0:
+                points_array[:, i] = (points_array[:, i] - min_val) / (max_val - min_val)
+            else:
+                points_array[:, i] = 0.0
+        normalized_keypoints.append(points_array.tolist())
+    return normalized_keypoints
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-hand normalization loop with normalize_hands().")
+    parser.add_argument('--hands', type=int, default=1_000_000, help="number of [21, 3] hand entries")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    hands = rng.random((args.hands, 21, 3))
+    hands[::10] = 0.0  # Frames without a detected hand, exercises the zero-range guard
+    keypoints = hands.tolist()  # The loop runs on the nested lists json.load returns
+
+    start = time.perf_counter()
+    expected = normalize_keypoints_loop(keypoints)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalized = normalize_hands(hands)
+    vectorized_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalized_list = normalize_hands(keypoints).tolist()
+    vectorized_list_s = time.perf_counter() - start
+
+    assert normalized_list == expected, "normalize_hands() differs from the per-hand loop"
+    assert np.array_equal(normalized, np.array(expected))
+
+    print(f"hands:                        {args.hands}")
+    print(f"per-hand loop:                {loop_s:.3f} s")
+    print(f"normalize_hands (array):      {vectorized_s:.3f} s  ({loop_s / vectorized_s:.0f}x)")
+    print(f"normalize_hands (lists in/out): {vectorized_list_s:.3f} s  ({loop_s / vectorized_list_s:.1f}x)")
+    print("outputs identical")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataPreProcessing'))
+from keypoint_store import FRAME_SHAPE, KeypointStore
+from normalization import NORMALIZATION_MODES, FrameNormalizer, normalize_hands
+
+def load_frames(store_path, count, seed):
+    """ [count, 2, 21, 3] float32 frames from a store, or random landmarks with some missing hands. """
+    if store_path:
+        keypoints = np.asarray(KeypointStore(store_path).keypoints[:count], dtype=np.float32)
+        if len(keypoints):
+            return keypoints
+    rng = np.random.default_rng(seed)
+    frames = rng.random((count,) + FRAME_SHAPE).astype(np.float32)
+    frames[rng.random((count, 2)) < 0.2] = 0.0  # Undetected hands are all zeros
+    return frames
+
+def time_per_frame(function, frames, repeats):
+    """ Best of `repeats` runs of function over every frame, in microseconds per frame. """
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for frame in frames:
+            function(frame)
+        best = min(best, time.perf_counter() - start)
+    return best / len(frames) * 1e6
+
+def allocated_per_frame(function, frames):
+    """ Bytes still allocated or peak-allocated by numpy/Python while running function over the frames, per frame. """
+    function(frames[0])  # Warm up lazily created state
+    tracemalloc.start()
+    for frame in frames:
+        function(frame)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / len(frames)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame cost and exactness of the online hand normalizer.")
+    parser.add_argument('--store', help="keypoint store to take frames from, random frames if omitted")
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_online_normalization.json', help="JSON file for the results")
+    args = parser.parse_args()
+
+    frames = load_frames(args.store, args.frames, args.seed)
+    report = {'frames': len(frames), 'modes': {}}
+    for mode in NORMALIZATION_MODES:
+        normalizer = FrameNormalizer(mode)
+        buffer = np.empty(FRAME_SHAPE)
+        online = lambda frame: normalizer.normalize_into(frame, buffer)
+        offline = lambda frame: normalize_hands(frame, mode)
+
+        # Bit for bit against the offline function, per frame and on the whole batch at once
+        batch = normalize_hands(frames, mode)
+        exact = all(np.array_equal(online(frame).view(np.int64), expected.view(np.int64))
+                    for frame, expected in zip(frames, batch))
+        exact = exact and all(np.array_equal(online(frame).view(np.int64), offline(frame).view(np.int64))
+                              for frame in frames)
+
+        report['modes'][mode] = {
+            'bit_exact': bool(exact),
+            'online_us': time_per_frame(online, frames, args.repeats),
+            'offline_us': time_per_frame(offline, frames, args.repeats),
+            'online_peak_bytes_per_frame': allocated_per_frame(online, frames),
+        }
+
+    print(f"{len(frames)} frames")
+    for mode, result in report['modes'].items():
+        print(f"  {mode:7s} online {result['online_us']:6.2f} us/frame  normalize_hands {result['offline_us']:6.2f} "
+              f"us/frame  bit exact: {result['bit_exact']}  "
+              f"peak allocation {result['online_peak_bytes_per_frame']:.2f} B/frame")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
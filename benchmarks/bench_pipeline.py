@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataPreProcessing'))
+from instrumentation import peak_rss_mb
+from keypoint_store import to_hand_entries
+from video_keypoints import create_hands, extract_dataset, list_videos, mp_drawing, mp_hands, results_to_array
+
+STAGES = ('decode', 'cvtColor', 'hands.process', 'draw_landmarks', 'imwrite', 'json.dump')
+
+def make_synthetic_videos(dataset_folder, categories=2, gestures=2, videos=3, frames=60, size=(640, 480), fps=30):
+    """ Write small synthetic gesture videos in the videos/<category>/<gesture>/ layout. """
+    width, height = size
+    rng = np.random.default_rng(0)
+    for c in range(categories):
+        for g in range(gestures):
+            gesture_path = os.path.join(dataset_folder, f'category{c}', f'gesture{g}')
+            os.makedirs(gesture_path, exist_ok=True)
+            for v in range(videos):
+                writer = cv2.VideoWriter(os.path.join(gesture_path, f'video{v}.avi'),
+                                         cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+                background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+                for f in range(frames):
+                    frame = background.copy()
+                    # A skin-coloured blob with "fingers" moving across the frame
+                    cx = int(width * (0.2 + 0.6 * f / max(frames - 1, 1)))
+                    cy = height // 2
+                    cv2.ellipse(frame, (cx, cy), (60, 80), 0, 0, 360, (140, 170, 220), -1)
+                    for k in range(5):
+                        cv2.line(frame, (cx, cy - 40), (cx - 50 + 25 * k, cy - 140), (140, 170, 220), 18)
+                    writer.write(frame)
+                writer.release()
+
+_worker_hands = None
+
+def _init_worker():
+    global _worker_hands
+    _worker_hands = create_hands()
+
+def time_video(video_path, frames_dir, hands=None, max_frames=200):
+    """ Run the convert() / extraction stages on one video, timing each stage per frame in seconds. """
+    hands = hands if hands is not None else _worker_hands
+    hands.reset()
+    times = {stage: [] for stage in STAGES}
+    cap = cv2.VideoCapture(video_path)
+    keypoints = []
+    mask = []
+    count = 0
+    while count < max_frames:
+        start = time.perf_counter()
+        ret, frame = cap.read()
+        times['decode'].append(time.perf_counter() - start)
+        if not ret:
+            times['decode'].pop()  # The failed read at the end of the video is not a frame
+            break
+
+        start = time.perf_counter()
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        times['cvtColor'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = hands.process(frame_rgb)
+        times['hands.process'].append(time.perf_counter() - start)
+
+        frame_keypoints = np.zeros((2, 21, 3), dtype=np.float32)
+        frame_mask = np.zeros(2, dtype=bool)
+        results_to_array(results, frame_keypoints, frame_mask)
+        keypoints.append(frame_keypoints)
+        mask.append(frame_mask)
+
+        start = time.perf_counter()
+        for hand_landmarks in results.multi_hand_landmarks or []:
+            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+        times['draw_landmarks'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cv2.imwrite(os.path.join(frames_dir, f"{os.path.basename(video_path)}_frame_{count}.jpeg"), frame)
+        times['imwrite'].append(time.perf_counter() - start)
+        count += 1
+    cap.release()
+
+    start = time.perf_counter()
+    with open(os.path.join(frames_dir, os.path.basename(video_path) + '.json'), 'w') as f:
+        json.dump(to_hand_entries(np.array(keypoints).reshape(-1, 2, 21, 3), np.array(mask).reshape(-1, 2)), f,
+                  indent=4)
+    times['json.dump'].append(time.perf_counter() - start)
+    return count, times
+
+def _time_in_worker(job):
+    return time_video(*job)
+
+def run_stages(dataset_folder, frames_folder, workers):
+    """ Time every stage over all videos, serially or over a process pool. Returns (frames, times, wall seconds). """
+    jobs = []
+    for i, (category, gesture, video_path) in enumerate(list_videos(dataset_folder)):
+        frames_dir = os.path.join(frames_folder, str(i))
+        os.makedirs(frames_dir, exist_ok=True)
+        jobs.append((video_path, frames_dir))
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            results = list(executor.map(_time_in_worker, jobs))
+    else:
+        hands = create_hands()
+        results = [time_video(video_path, frames_dir, hands) for video_path, frames_dir in jobs]
+        hands.close()
+    wall = time.perf_counter() - start
+
+    frames = sum(count for count, times in results)
+    times = {stage: [t for count, video_times in results for t in video_times[stage]] for stage in STAGES}
+    return frames, times, wall
+
+def summarize(frames, times, wall):
+    summary = {'frames': frames, 'wall_s': wall, 'frames_per_s': frames / wall if wall > 0 else None, 'stages': {}}
+    total = sum(sum(stage_times) for stage_times in times.values())
+    for stage, stage_times in times.items():
+        if not stage_times:
+            continue
+        stage_times = np.array(stage_times) * 1000
+        summary['stages'][stage] = {
+            'calls': len(stage_times),
+            'total_ms': float(stage_times.sum()),
+            'share': float(stage_times.sum() / 1000 / total) if total > 0 else None,
+            'p50_ms': float(np.percentile(stage_times, 50)),
+            'p95_ms': float(np.percentile(stage_times, 95)),
+        }
+    return summary
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(name, summary):
+    print(f"\n{name}: {summary['frames']} frames in {summary['wall_s']:.2f} s ({summary['frames_per_s']:.1f} frames/s)")
+    for stage, stats in summary.get('stages', {}).items():
+        print(f"  {stage:15s} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+              f"share {100 * stats['share']:5.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage throughput benchmark of the extraction pipeline.")
+    parser.add_argument('--dataset', help="videos/ folder to benchmark, synthetic videos are generated if omitted")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="process count for the parallel runs")
+    parser.add_argument('--frames', type=int, default=60, help="frames per synthetic video")
+    parser.add_argument('--videos', type=int, default=3, help="synthetic videos per gesture")
+    parser.add_argument('--output', default='bench_pipeline.json', help="JSON file for the results")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    try:
+        dataset_folder = args.dataset
+        if dataset_folder is None:
+            dataset_folder = os.path.join(workdir, 'videos')
+            make_synthetic_videos(dataset_folder, videos=args.videos, frames=args.frames)
+
+        report = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'platform': platform.platform(), 'cpus': os.cpu_count(), 'workers': args.workers, 'runs': {}}
+
+        for name, workers in (('serial', 1), ('parallel', args.workers)):
+            frames, times, wall = run_stages(dataset_folder, os.path.join(workdir, f'frames_{name}'), workers)
+            report['runs'][f'stages_{name}'] = summarize(frames, times, wall)
+
+            # End-to-end fused extraction, the path that replaces convert() + extract_keypoints_from_frames()
+            start = time.perf_counter()
+            dataset = extract_dataset(dataset_folder, workers=workers)
+            wall = time.perf_counter() - start
+            frames = sum(len(result['keypoints']) for gestures in dataset.values()
+                         for videos in gestures.values() for result in videos.values())
+            report['runs'][f'fused_{name}'] = summarize(frames, {}, wall)
+
+        report['peak_rss_mb'] = peak_rss_mb()
+        report['peak_rss_worker_mb'] = peak_rss_mb(children=True)  # Largest pool worker
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, summary in report['runs'].items():
+        print_summary(name, summary)
+    if report['peak_rss_mb'] is not None:
+        print(f"\npeak memory: {report['peak_rss_mb']:.1f} MB, largest worker {report['peak_rss_worker_mb']:.1f} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -3,12 +3,19 @@ import os
 import json
 import mediapipe as mp
 import numpy as np
+from inference_input import InferenceInput
+from instrumentation import export_metrics, metrics, peak_rss_mb
+from json_stream import JsonGestureWriter, normalize_json_stream
+from keypoint_store import iter_gesture_entries
+from normalization import normalize_hands
+from video_keypoints import iter_dataset
 
 mp_hands = mp.solutions.hands
 hands = mp_hands.Hands()
 
-def extract_keypoints_from_frames(frames_path):
+def extract_keypoints_from_frames(frames_path, inference_size=None, crop=False):
     keypoints_data = {}
+    inference_input = InferenceInput(inference_size, crop)  # Optionally run Mediapipe on smaller images
 
     # Iterate over each main category (e.g., 'Adjectives', 'Pronouns', 'Places')
     for category in os.listdir(frames_path):
@@ -19,6 +26,7 @@ def extract_keypoints_from_frames(frames_path):
         for subcategory in os.listdir(category_path):
             subcategory_path = os.path.join(category_path, subcategory)
             keypoints_video = []
+            inference_input.reset()
 
             # Iterate over each frame image in the subcategory folder
             for frame in sorted(os.listdir(subcategory_path)):
@@ -28,8 +36,7 @@ def extract_keypoints_from_frames(frames_path):
                 if img is None:
                     continue
 
-                frame_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                results = hands.process(frame_rgb)
+                results = inference_input.process(hands, img)  # Landmarks in full-image coordinates
 
                 if results.multi_hand_landmarks:
                     for hand_landmarks, handedness in zip(results.multi_hand_landmarks, results.multi_handedness):
@@ -50,21 +57,13 @@ def extract_keypoints_from_frames(frames_path):
 
     return keypoints_data
 
-def normalize_keypoints(keypoints):
-    normalized_keypoints = []
-    for handedness, points in keypoints:
-        points_array = np.array(points)
-        # Normalize each axis (x, y, z)
-        for i in range(3):  # for x, y, z
-            min_val = points_array[:, i].min()
-            max_val = points_array[:, i].max()
-            # Avoid division by zero
-            if max_val - min_val > 0:
-                points_array[:, i] = (points_array[:, i] - min_val) / (max_val - min_val)
-            else:
-                points_array[:, i] = 0.0  # If all points are the same, set to 0.0
-        normalized_keypoints.append((handedness, points_array.tolist()))  # Keep handedness with normalized points
-    return normalized_keypoints
+def normalize_keypoints(keypoints, mode='minmax'):
+    if not keypoints:
+        return []
+    handedness = [hand for hand, points in keypoints]
+    # Normalize all hands of the gesture at once as a stacked [N, 21, 3] array
+    normalized_points = normalize_hands([points for hand, points in keypoints], mode).tolist()
+    return list(zip(handedness, normalized_points))  # Keep handedness with normalized points
 
 def normalize_json_keypoints(json_file):
     with open(json_file, 'r') as f:
@@ -78,22 +77,33 @@ def normalize_json_keypoints(json_file):
 
     return normalized_data
 
-def main():
-    frames_path = r"D:\FINAL_YEAR_PROJECT\Gesture2Speech\frames"  # Folder containing categories like 'Adjectives', 'Pronouns', 'Places'
-    keypoints = extract_keypoints_from_frames(frames_path)
-
-    # Save extracted keypoints to JSON
-    with open('keypoints1.json', 'w') as f:
-        json.dump(keypoints, f, indent=4)
+def normalize_json_keypoints_stream(json_file, output_file, mode='minmax'):
+    """ Like normalize_json_keypoints(), but reads and writes one gesture at a time to bound memory. """
+    normalize_json_stream(json_file, output_file, lambda keypoints: normalize_keypoints(keypoints, mode))
 
-    # Normalize the keypoints from the JSON file
-    normalized_data = normalize_json_keypoints('keypoints1.json')
-
-    # Save the normalized data to a new JSON file
-    with open('normalized_keypoints1.json', 'w') as f:
-        json.dump(normalized_data, f, indent=4)
+def main():
+    dataset_folder = r"D:\FINAL_YEAR_PROJECT\Gesture2Speech\videos"  # Folder containing categories like 'Adjectives', 'Pronouns', 'Places'
+    workers = os.cpu_count() or 1  # Number of extraction processes, 1 runs serially
+
+    # Go straight from the videos to keypoints, without the JPEG frames written by convert(),
+    # and write the extracted and normalized keypoints gesture by gesture
+    with open('keypoints1.json', 'w') as keypoints_file, open('normalized_keypoints1.json', 'w') as normalized_file:
+        keypoints_writer = JsonGestureWriter(keypoints_file, indent=4)
+        normalized_writer = JsonGestureWriter(normalized_file, indent=4)
+        for category, gesture, keypoints in iter_gesture_entries(iter_dataset(dataset_folder, workers=workers)):
+            keypoints_writer.add(category, gesture, keypoints)
+            with metrics.timer('normalize_gesture_seconds'):
+                normalized = normalize_keypoints(keypoints)
+            normalized_writer.add(category, gesture, normalized)
+            metrics.count('gestures_normalized')
+        keypoints_writer.close()
+        normalized_writer.close()
 
     print("Normalization complete. Normalized keypoints saved to 'normalized_keypoints1.json'.")
+    peak_mb = peak_rss_mb()
+    if peak_mb is not None:
+        print(f"Peak memory: {peak_mb:.1f} MB")
+    export_metrics()
 
 if __name__== "__main__":
     main()
@@ -0,0 +1,150 @@
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+from instrumentation import metrics
+from keypoint_augmentation import augment_sequence
+from keypoint_store import KeypointStore
+from resampling import resample_batch
+from video_split import load_split, video_labels
+
+class BatchLoader:
+    """ Shuffled, fixed-size training batches over the videos of a keypoint store split.
+
+    Every batch is a tuple of [B, T, 2, 21, 3] keypoints, a [B, T, 2] hand mask, a [B, T]
+    mask of valid frames and [B] class ids (see video_split.video_labels()). Videos are
+    read straight from the store's memory maps and resampled to T frames.
+
+    Batches are built by background threads into a bounded window of `prefetch` batches,
+    and yielded in order. With augment=True every video gets one random augmentation
+    (keypoint_augmentation.augment_sequence()) per epoch. The batch contents only depend
+    on seed and the epoch number, not on the thread count.
+    """
+
+    def __init__(self, store_path, indices=None, length=64, batch_size=32, shuffle=True, seed=0, workers=2,
+                 prefetch=4, augment=False, method='linear', drop_last=False, augment_options=None):
+        self.store = KeypointStore(store_path)
+        self.indices = np.arange(len(self.store)) if indices is None else np.asarray(indices)
+        self.labels, self.classes = video_labels(self.store)
+        self.length = length
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.workers = workers
+        self.prefetch = prefetch
+        self.augment = augment
+        self.augment_options = augment_options or {}
+        self.method = method
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.samples = 0
+        self.seconds = 0.0
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.indices) // self.batch_size
+        return -(-len(self.indices) // self.batch_size)
+
+    def load_batch(self, videos, rng=None):
+        """ Build one batch from store video indices. """
+        keypoints_list, mask_list = [], []
+        for i in videos:
+            keypoints, mask = self.store[i]
+            if rng is not None:
+                augmented, augmented_mask = augment_sequence(keypoints, mask, 1, rng, **self.augment_options)
+                keypoints, mask = augmented[0], augmented_mask[0]
+            keypoints_list.append(keypoints)
+            mask_list.append(mask)
+        keypoints, mask, valid = resample_batch(keypoints_list, mask_list, self.length, self.method)
+        return keypoints, mask, valid, self.labels[videos]
+
+    def _batches(self):
+        order = self.indices
+        if self.shuffle:
+            order = np.random.default_rng([self.seed, self.epoch]).permutation(order)
+        return [order[start:start + self.batch_size] for start in range(0, len(self) * self.batch_size,
+                                                                         self.batch_size)]
+
+    def _worker(self, epoch, jobs, results, window, stop):
+        while not stop.is_set():
+            window.acquire()  # At most `prefetch` batches built but not yet consumed
+            if stop.is_set():
+                return
+            try:
+                n, videos = jobs.get_nowait()
+            except queue.Empty:
+                window.release()
+                return
+            try:
+                rng = np.random.default_rng([self.seed, epoch, n]) if self.augment else None
+                results.put((n, self.load_batch(videos, rng), None))
+            except Exception as e:
+                results.put((n, None, e))
+                return
+
+    def __iter__(self):
+        batches = self._batches()
+        jobs = queue.Queue()
+        for job in enumerate(batches):
+            jobs.put(job)
+        results = queue.Queue()
+        window = threading.Semaphore(self.prefetch)
+        stop = threading.Event()
+        threads = [threading.Thread(target=self._worker, args=(self.epoch, jobs, results, window, stop), daemon=True)
+                   for _ in range(max(self.workers, 1))]
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        start = time.perf_counter()
+        try:
+            for n in range(len(batches)):
+                while n not in pending:
+                    done, batch, error = results.get()
+                    if error is not None:
+                        raise error
+                    pending[done] = batch
+                batch = pending.pop(n)
+                window.release()
+                self.samples += len(batch[3])
+                metrics.count('loader_samples', len(batch[3]))
+                yield batch
+        finally:
+            stop.set()
+            for _ in threads:
+                window.release()  # Wake workers waiting for room so they see the stop flag
+            self.seconds += time.perf_counter() - start
+            self.epoch += 1
+
+    def samples_per_second(self):
+        """ Samples yielded per second of iteration so far, including the time the consumer took. """
+        return self.samples / self.seconds if self.seconds > 0 else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Iterate a keypoint store split in batches and report throughput.")
+    parser.add_argument('store', help="keypoint store")
+    parser.add_argument('--split', help="split .npz from video_split.py, all videos if omitted")
+    parser.add_argument('--subset', choices=['train', 'test'], default='train')
+    parser.add_argument('--length', type=int, default=64, help="frames per sample")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--prefetch', type=int, default=4)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--augment', action='store_true')
+    args = parser.parse_args()
+
+    indices = None
+    if args.split:
+        train, test = load_split(args.split, KeypointStore(args.store))
+        indices = train if args.subset == 'train' else test
+    loader = BatchLoader(args.store, indices, args.length, args.batch_size, workers=args.workers,
+                         prefetch=args.prefetch, augment=args.augment)
+    for epoch in range(args.epochs):
+        for keypoints, mask, valid, labels in loader:
+            pass
+    print(f"{loader.samples} samples in {loader.seconds:.2f} s ({loader.samples_per_second():.0f} samples/s), "
+          f"batches of [{args.batch_size}, {args.length}, 2, 21, 3].")
+
+if __name__ == '__main__':
+    main()
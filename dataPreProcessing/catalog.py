@@ -0,0 +1,126 @@
+import os
+import json
+import argparse
+import cv2
+from instrumentation import metrics
+
+CATALOG_VERSION = 1
+CATALOG_FILE = '.catalog.L{levels}.json'  # In the dataset folder, one per layout depth; hidden names are not scanned
+FIELDS = ('category', 'gesture', 'video', 'size', 'mtime_ns', 'frames', 'fps', 'duration')
+
+def probe_video(video_path):
+    """ Frame count, FPS and duration in seconds of a video, from its container header. """
+    cap = cv2.VideoCapture(video_path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = float(cap.get(cv2.CAP_PROP_FPS))
+    cap.release()
+    return frames, fps, frames / fps if fps > 0 else 0.0
+
+def _scan(folder, levels):
+    """ Yield (label path, DirEntry) for every file `levels` directories below folder, in sorted order. """
+    with os.scandir(folder) as it:
+        entries = sorted((entry for entry in it if not entry.name.startswith('.')), key=lambda entry: entry.name)
+    for entry in entries:
+        if levels == 0:
+            if entry.is_file():
+                yield (), entry
+        elif entry.is_dir():
+            for labels, file_entry in _scan(entry.path, levels - 1):
+                yield (entry.name,) + labels, file_entry
+
+class DatasetCatalog:
+    """ Index of every video under a dataset folder, with size, frame count, FPS and duration.
+
+    levels=2 reads the videos/<category>/<gesture>/<video> layout, levels=1 the
+    <gesture>/<video> layout (category is then ''). refresh() re-scans the tree once with
+    os.scandir and only probes videos whose size or mtime changed since the last save.
+    """
+
+    def __init__(self, dataset_folder, path=None, levels=2):
+        self.dataset_folder = os.path.abspath(dataset_folder)
+        self.path = path or os.path.join(self.dataset_folder, CATALOG_FILE.format(levels=levels))
+        self.levels = levels
+        self.entries = []
+        self._dirty = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                catalog = json.load(f)
+            # Rows are stored as lists in FIELDS order to keep the file small
+            if catalog.get('version') == CATALOG_VERSION and catalog.get('levels') == levels:
+                self.entries = [dict(zip(catalog['fields'], row)) for row in catalog['videos']]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def video_path(self, entry):
+        """ Absolute path of a catalog entry's video. """
+        labels = (entry['category'], entry['gesture']) if self.levels == 2 else (entry['gesture'],)
+        return os.path.join(self.dataset_folder, *labels, entry['video'])
+
+    def refresh(self):
+        """ Re-scan the dataset folder. Returns the number of (new or changed, removed) videos. """
+        known = {(entry['category'], entry['gesture'], entry['video']): entry for entry in self.entries}
+        entries = []
+        probed = 0
+        for labels, file_entry in _scan(self.dataset_folder, self.levels):
+            category, gesture = labels if self.levels == 2 else ('', labels[0])
+            stat = file_entry.stat()
+            entry = known.pop((category, gesture, file_entry.name), None)
+            if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+                frames, fps, duration = probe_video(file_entry.path)
+                entry = {'category': category, 'gesture': gesture, 'video': file_entry.name, 'size': stat.st_size,
+                         'mtime_ns': stat.st_mtime_ns, 'frames': frames, 'fps': fps, 'duration': duration}
+                probed += 1
+            entries.append(entry)
+        metrics.count('catalog_videos_probed', probed)
+        if probed or known or len(entries) != len(self.entries):
+            self._dirty = True
+        self.entries = entries
+        return probed, len(known)
+
+    def save(self):
+        """ Write the catalog atomically, if it changed. """
+        if not self._dirty:
+            return
+        catalog = {'version': CATALOG_VERSION, 'levels': self.levels, 'fields': FIELDS,
+                   'videos': [[entry[field] for field in FIELDS] for entry in self.entries]}
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(catalog, f, separators=(',', ':'))
+        os.replace(self.path + '.tmp', self.path)
+        self._dirty = False
+
+    def videos(self):
+        """ List (category, gesture, video_path) for every video, in sorted order. """
+        return [(entry['category'], entry['gesture'], self.video_path(entry)) for entry in self.entries]
+
+def load_catalog(dataset_folder, path=None, levels=2, refresh=True):
+    """ Load a dataset's catalog, bring it up to date with the folder and save it. """
+    catalog = DatasetCatalog(dataset_folder, path, levels)
+    if refresh:
+        catalog.refresh()
+        try:
+            catalog.save()
+        except OSError:
+            pass  # Read-only dataset, the catalog is just rebuilt next time
+    return catalog
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the video catalog of a dataset folder.")
+    parser.add_argument('dataset', help="videos/ folder to index")
+    parser.add_argument('--catalog', help=f"catalog file, defaults to <dataset>/{CATALOG_FILE.format(levels='<levels>')}")
+    parser.add_argument('--levels', type=int, default=2, help="label folders above the videos")
+    args = parser.parse_args()
+
+    catalog = DatasetCatalog(args.dataset, args.catalog, args.levels)
+    probed, removed = catalog.refresh()
+    catalog.save()
+    frames = sum(entry['frames'] for entry in catalog)
+    duration = sum(entry['duration'] for entry in catalog)
+    print(f"{len(catalog)} videos, {frames} frames, {duration / 60:.1f} min "
+          f"({probed} new or changed, {removed} removed). Catalog saved to '{catalog.path}'.")
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import json
-import random
 import os
+import numpy as np
+from point_sampling import subsample_frames
 
 def load_keypoints_json(filepath):
     """ Load the JSON file containing keypoints data. """
@@ -11,28 +12,13 @@ def replace_empty_with_default(keypoints_frame, default_value=[0.0, 0.0, 0.0]):
     """ Replace empty arrays in a keypoints frame with the default value. """
     return [kp if len(kp)!=0 else default_value for kp in keypoints_frame]
 
-def process_keypoints(keypoints_list):
-    """ Process keypoints by replacing empty arrays and sampling 70% of the keypoints. """
-    output_keypoints_list = []
-    for keypoints_frame in keypoints_list:
-        # print(keypoints_frame)
-        # Ensure no empty arrays exist, replace with [0.0, 0.0, 0.0]
-        # keypoints_frame = replace_empty_with_default(keypoints_frame, default_value=[0.0, 0.0, 0.0])
+def process_keypoints(keypoints_list, ratio=0.7, rng=None):
+    """ One augmented copy of a label's frames: a random ratio of the points of each frame.
 
-        # Check if the frame is not empty after replacement
-        if len(keypoints_frame)!=0:
-            num_points_to_select = int(0.7 * len(keypoints_frame))
-            random_points = random.sample(keypoints_frame, num_points_to_select)
-        else:
-            random_points = [[0.0, 0.0, 0.0]]  # If frame is empty, insert a default point
-        
-        # Ensure random_points also don't have any empty lists
-        if len(random_points)==0:
-            random_points=[[0.0,0.0,0.0]]
-        output_keypoints_list.append(random_points)
-            # print("***")
-
-    return output_keypoints_list
+    Uses point_sampling.subsample_frames() with rng (a numpy Generator), so a different rng
+    gives a different copy; frames left empty become [[0.0, 0.0, 0.0]].
+    """
+    return subsample_frames(keypoints_list, ratio, rng)
 
 def main():
     # Path to the normalized keypoints JSON file
@@ -51,6 +37,8 @@ def main():
     os.makedirs(base_folder, exist_ok=True)
     print(f"Base folder created: {base_folder}")
 
+    rng = np.random.default_rng(0)  # Fixed seed: rerunning rewrites the same keypoints.json files
+
     # Iterate over each category (like Adjectives, Pronouns, etc.)
     for category, labels_data in keypoints_data.items():
         category_folder = os.path.join(base_folder, category)
@@ -67,7 +55,7 @@ def main():
             output_path = os.path.join(label_folder, 'keypoints.json')
 
             # Process keypoints and randomly select 70% per frame, replacing empty arrays
-            output_keypoints_list = process_keypoints(keypoints_list)
+            output_keypoints_list = process_keypoints(keypoints_list, rng=rng)
 
             # Write the processed keypoints to keypoints.json
             if output_keypoints_list:
@@ -1,6 +1,11 @@
 import json
 import random
 import os
+import numpy as np
+from instrumentation import export_metrics, metrics
+from point_sampling import frames_to_array, subsample_frames
+from quantization import quantized_arrays
+from shards import ShardWriter
 
 def load_keypoints_json(filepath):
     """ Load the JSON file containing keypoints data. """
@@ -11,25 +16,21 @@ def replace_empty_with_default(keypoints_frame, default_value=[0.0, 0.0, 0.0]):
     """ Replace empty arrays in a keypoints frame with the default value. """
     return [kp if len(kp)!=0 else default_value for kp in keypoints_frame]
 
-def process_keypoints(keypoints_list):
-    """ Process keypoints by replacing empty arrays and sampling 70% of the keypoints. """
-    output_keypoints_list = []
-    for keypoints_frame in keypoints_list:
-        if len(keypoints_frame) != 0:
-            num_points_to_select = int(0.7 * len(keypoints_frame))
-            random_points = random.sample(keypoints_frame, num_points_to_select)
-        else:
-            random_points = [[0.0, 0.0, 0.0]]  # If frame is empty, insert a default point
-
-        if len(random_points) == 0:
-            random_points = [[0.0, 0.0, 0.0]]
-        output_keypoints_list.append(random_points)
-
-    return output_keypoints_list
-
-def split_data_by_label(keypoints_list, train_ratio=0.8):
-    """ Split keypoints list into training and testing sets based on the given ratio. """
-    random.shuffle(keypoints_list)
+def process_keypoints(keypoints_list, ratio=0.7, rng=None):
+    """ Keep a random ratio of the points of every frame before the train/test split.
+
+    Thin wrapper over point_sampling.subsample_frames(), which draws the points of all
+    frames at once from rng (a numpy Generator); frames left empty become [[0.0, 0.0, 0.0]].
+    """
+    return subsample_frames(keypoints_list, ratio, rng)
+
+def split_data_by_label(keypoints_list, train_ratio=0.8, seed=None):
+    """ Split keypoints list into training and testing sets based on the given ratio.
+
+    This splits frames, so frames of one video can land on both sides; video_split.py
+    splits whole videos of a keypoint store instead. A seed makes the shuffle reproducible.
+    """
+    (random.Random(seed) if seed is not None else random).shuffle(keypoints_list)
     
     split_idx = int(len(keypoints_list) * train_ratio)
     train_data = keypoints_list[:split_idx]
@@ -52,12 +53,36 @@ def save_split_data(data, output_dir, split_type):
 
             output_path = os.path.join(label_folder, 'keypoints.json')
             try:
-                with open(output_path, 'w') as outfile:
-                    json.dump({label: keypoints_list}, outfile)
+                with metrics.timer(f'save_{split_type}_seconds'):
+                    with open(output_path, 'w') as outfile:
+                        json.dump({label: keypoints_list}, outfile)
                 print(f"{split_type.capitalize()} data saved: {output_path}")
+                if metrics.enabled:
+                    metrics.count(f'{split_type}_files_written')
+                    metrics.count(f'{split_type}_bytes_written', os.path.getsize(output_path))
+                    metrics.count(f'{split_type}_samples_written', len(keypoints_list))
             except Exception as e:
+                metrics.count(f'{split_type}_write_errors')
                 print(f"Error writing {split_type} data to {output_path}: {e}")
 
+def save_split_shards(data, output_dir, split_type, samples_per_shard=256, workers=4, quantization=None):
+    """ Save the split data as compressed shards, one sample per category/label, instead of JSON files.
+
+    Each sample holds the label's frames padded to [F, P, 3] and the point count of every frame.
+    With quantization ('float16' or 'uint16') the points take 2 bytes per value; read them
+    back with quantization.dequantized_array(arrays, 'points').
+    """
+    split_dir = os.path.join(output_dir, split_type)
+    with metrics.timer(f'save_{split_type}_seconds'):
+        with ShardWriter(split_dir, samples_per_shard, workers) as writer:
+            for category, labels_data in data.items():
+                for label, keypoints_list in labels_data.items():
+                    points, counts = frames_to_array(keypoints_list)
+                    writer.add(f'{category}/{label}', '', counts=counts.astype(np.int32),
+                               **quantized_arrays('points', points, quantization))
+                    metrics.count(f'{split_type}_samples_written', len(keypoints_list))
+    print(f"{split_type.capitalize()} data saved: {split_dir}")
+
 def main():
     # Path to the normalized keypoints JSON file
     input_file = r'/Users/ranjannaik/Desktop/FINAL_YEAR_PROJECT/Gesture2Speech/dataPreProcessing/normalized_keypoints.json'
@@ -78,6 +103,8 @@ def main():
     os.makedirs(base_folder, exist_ok=True)
     print(f"Main folder created: {base_folder}")
 
+    rng = np.random.default_rng(0)  # Shared by all labels; with split seed 0 the train/test shards are the same every run
+
     # Process and split data into train and test sets
     train_data = {}
     test_data = {}
@@ -88,20 +115,21 @@ def main():
         
         for label, keypoints_list in labels_data.items():
             # Process keypoints for each label
-            processed_keypoints_list = process_keypoints(keypoints_list)
+            processed_keypoints_list = process_keypoints(keypoints_list, rng=rng)
 
             # Split processed keypoints into 80% train and 20% test
-            train_keypoints, test_keypoints = split_data_by_label(processed_keypoints_list, train_ratio=0.8)
+            train_keypoints, test_keypoints = split_data_by_label(processed_keypoints_list, train_ratio=0.8, seed=0)
             
             # Add split data to respective train and test dictionaries
             train_data[category][label] = train_keypoints
             test_data[category][label] = test_keypoints
 
     # Save training data
-    save_split_data(train_data, base_folder, split_type='train')
+    save_split_shards(train_data, base_folder, split_type='train')
 
     # Save testing data
-    save_split_data(test_data, base_folder, split_type='test')
+    save_split_shards(test_data, base_folder, split_type='test')
+    export_metrics()
 
 # Corrected condition to check if the script is being run as the main module
 if __name__ == "__main__":
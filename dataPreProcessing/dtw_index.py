@@ -0,0 +1,410 @@
+import time
+import argparse
+import numpy as np
+from keypoint_store import KeypointStore
+from labels import label_mapping
+from normalization import normalize_hands
+from resampling import resample_batch
+from video_split import load_split, stratified_split
+
+def frame_features(keypoints_list, mask_list, length=32):
+    """ [B, length, 86] DTW features: min-max normalized x, y of both hands (zero when missing) and the hand mask. """
+    keypoints, mask, valid = resample_batch(keypoints_list, mask_list, length)
+    shape = normalize_hands(keypoints)[..., :2] * mask[..., None, None]
+    batch = len(keypoints)
+    return np.concatenate([shape.reshape(batch, length, -1), mask], axis=2).astype(np.float32)
+
+def envelope(features, radius):
+    """ Running max and min of [..., L, D] features over +-radius frames, the LB_Keogh envelope. """
+    length = features.shape[-2]
+    upper = features.copy()
+    lower = features.copy()
+    for shift in range(1, radius + 1):
+        upper[..., :length - shift, :] = np.maximum(upper[..., :length - shift, :], features[..., shift:, :])
+        upper[..., shift:, :] = np.maximum(upper[..., shift:, :], features[..., :length - shift, :])
+        lower[..., :length - shift, :] = np.minimum(lower[..., :length - shift, :], features[..., shift:, :])
+        lower[..., shift:, :] = np.minimum(lower[..., shift:, :], features[..., :length - shift, :])
+    return upper, lower
+
+def dtw_batch(query, candidates, radius, best=np.inf):
+    """ Banded DTW between a [L, D] query and [B, L, D] candidates, sum of squared frame distances.
+
+    Only the 2 * radius + 1 diagonals of the band are computed, and the candidates are the
+    last, contiguous axis so every step of the recurrence is one vector operation over all of
+    them. A candidate whose whole row is already at or above `best` is abandoned (its distance
+    is returned as inf); the arrays are compacted once half of the candidates are gone.
+    """
+    count, length = len(candidates), len(query)
+    band = 2 * radius + 1
+    # cost[i, o] is the squared distance of query frame i to candidate frame i + o - radius, [L, band, B]
+    cost = np.full((length, band, count), np.inf, dtype=np.float32)
+    for o in range(band):
+        shift = o - radius
+        rows = slice(max(0, -shift), min(length, length - shift))
+        frames = slice(max(0, shift), min(length, length + shift))
+        diff = query[rows, None, :] - candidates[:, frames, :].transpose(1, 0, 2)
+        cost[rows, o] = np.einsum('ijk,ijk->ij', diff, diff)
+    ids = np.arange(count)
+    # previous[o] is the cumulative cost at column i - 1 + o - radius of the last row, inf outside the band
+    previous = np.full((band, count), np.inf, dtype=np.float32)
+    previous[radius] = 0.0  # The virtual cell before (0, 0)
+    for i in range(length):
+        row = np.empty_like(previous)
+        for o in range(band):
+            # Up is the same column one row up (offset o + 1 there), diagonal is offset o there
+            step = previous[o] if o + 1 == band else np.minimum(previous[o], previous[o + 1])
+            if o:
+                step = np.minimum(step, row[o - 1])  # Left, same row
+            np.add(cost[i, o], step, out=row[o])
+        previous = row
+        alive = previous.min(axis=0) < best  # Early abandoning: the warping path cost only grows
+        if not alive.all():
+            if not alive.any():
+                return np.full(count, np.inf)
+            if 2 * alive.sum() <= len(ids):
+                ids, previous, cost = ids[alive], previous[:, alive], cost[:, :, alive]
+    distances = np.full(count, np.inf)
+    final = previous[radius].astype(np.float64)
+    distances[ids] = np.where(final < best, final, np.inf)
+    return distances
+
+def band_bound(query, frames, radius):
+    """ Lower bounds of the banded DTW distance of a [L, D] query to [B, L, D + 1] template frames.
+
+    The last column of frames is the squared norm of each frame. Every query frame is
+    matched to at least one template frame within the band, so the sum over query frames of
+    the smallest squared distance to those template frames is a lower bound. It takes the
+    minimum over whole frames where LB_Keogh takes it per feature, so it is never below
+    LB_Keogh. The distances are |q|^2 + |c|^2 - 2 q.c from one float32 matrix product, and
+    the bound is lowered by that product's worst-case rounding error so it stays a bound.
+    """
+    length, dims = query.shape
+    query_norms = np.einsum('ij,ij->i', query, query)
+    weights = np.empty((dims + 1, length), dtype=np.float32)
+    np.multiply(query.T, -2, out=weights[:dims])
+    weights[dims] = 1.0  # Picks up |c|^2 from the last column
+    cost = np.matmul(frames.reshape(-1, dims + 1), weights).reshape(len(frames), length, length)
+    # cost[b, j, i] is |c_j|^2 - 2 q_i.c_j; take the minimum over the band diagonals j = i + shift
+    nearest = cost.diagonal(0, 1, 2).copy()
+    for shift in range(1, radius + 1):
+        np.minimum(nearest[:, :length - shift], cost.diagonal(-shift, 1, 2), out=nearest[:, :length - shift])
+        np.minimum(nearest[:, shift:], cost.diagonal(shift, 1, 2), out=nearest[:, shift:])
+    bound = nearest.sum(axis=1) + query_norms.sum()
+    rounding = (dims + 1) * 2.0 ** -21 * (query_norms.sum() + length * frames[:, :, dims].max(axis=1))
+    return bound - rounding
+
+def cluster_bound(query, centroids, radii, radius):
+    """ Lower bounds of the banded DTW distance of a [L, D] query to every member of [K, L, D + 1] clusters.
+
+    centroids are the mean template frames of each cluster with their squared norm in the
+    last column, and radii [K, L] the largest distance of a member frame to its centroid
+    frame. By the triangle inequality a member frame is at least |q - m| - r from a query
+    frame, so summing the smallest of those over the band, as band_bound() does, bounds
+    every member of a cluster at once. The matrix product is rounded down like band_bound().
+    """
+    length, dims = query.shape
+    query_norms = np.einsum('ij,ij->i', query, query)
+    weights = np.empty((dims + 1, length), dtype=np.float32)
+    np.multiply(query.T, -2, out=weights[:dims])
+    weights[dims] = 1.0
+    cost = np.matmul(centroids.reshape(-1, dims + 1), weights).reshape(len(centroids), length, length)
+    nearest = np.full((len(centroids), length), np.inf)
+    for shift in range(-radius, radius + 1):
+        # Query frames i against centroid frames j = i + shift, cost[k, j, i] is on diagonal -shift
+        rows = slice(max(0, -shift), min(length, length - shift))
+        frames = slice(max(0, shift), min(length, length + shift))
+        norms = query_norms[rows] + centroids[:, frames, dims].astype(np.float64)
+        squared = cost.diagonal(-shift, 1, 2) + query_norms[rows] - (dims + 1) * 2.0 ** -21 * norms
+        gap = np.maximum(np.sqrt(np.maximum(squared, 0)) - radii[:, frames], 0)
+        np.minimum(nearest[:, rows], gap * gap, out=nearest[:, rows])
+    return nearest.sum(axis=1)
+
+def with_norms(frames):
+    """ [..., D] float frames as [..., D + 1] float32 with the squared norm of each frame appended. """
+    frames = np.asarray(frames, dtype=np.float64)
+    return np.concatenate([frames, np.einsum('...i,...i->...', frames, frames)[..., None]], axis=-1).astype(np.float32)
+
+class DTWIndex:
+    """ Nearest-neighbour gesture templates compared with banded dynamic time warping.
+
+    Sequences are resampled to `length` frames of frame_features(). The templates are
+    grouped into clusters of about `cluster_size` by k-means on their projected frames, and a
+    query is first bounded against every cluster with cluster_bound(), which holds for all of
+    its members; this is the only pass that touches every template. Templates are taken in
+    order of that bound, `chunk` at a time, and the ones left are bounded with LB_Keogh on
+    segment means (a lower bound by convexity), then with band_bound() on their frames
+    projected onto the first `components` principal axes of the template frames; a
+    projection only shortens distances, so that is a bound too. The best of them are
+    bounded again with band_bound() on the full frames, `batch` at a time, and only the
+    templates whose bounds beat the best distance so far get a DTW, with early abandoning.
+    add() appends a template in amortized O(1), into the cluster with the nearest centroid;
+    the principal axes and the clusters are refitted whenever the index has doubled.
+    """
+
+    def __init__(self, length=32, radius=3, segments=4, components=16, chunk=256, batch=8, cluster_size=16):
+        if length % segments:
+            raise ValueError(f"length {length} is not a multiple of segments {segments}")
+        self.length = length
+        self.radius = radius
+        self.segments = segments
+        self.components = components
+        self.chunk = chunk
+        self.batch = batch
+        self.cluster_size = cluster_size
+        self.count = 0
+        self.labels = np.zeros(0, dtype=np.int64)
+        self.clusters = np.zeros(0, dtype=np.int64)  # Cluster of every template
+        self.centroids = self.radii = self._centroid_points = None
+        self.templates = self._frames = self._projected = None
+        self.upper_means = self.lower_means = None
+        self.axes = None  # [components, D] principal axes, orthonormal rows
+        self._fitted = 0  # Templates when the axes and clusters were fitted
+        self.stats = {'queries': 0, 'pruned_cluster_bound': 0, 'pruned_segment_bound': 0,
+                      'pruned_projected_bound': 0, 'pruned_band_bound': 0, 'dtw': 0}
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, needed, features_shape):
+        capacity = 0 if self.templates is None else len(self.templates)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity, 16)
+        length, dims = features_shape
+        segment_shape = (capacity, self.segments, dims)
+        # Template frames with their squared norm appended, templates is a view without it
+        new = {'_frames': np.zeros((capacity, length, dims + 1), dtype=np.float32),
+               '_projected': np.zeros((capacity, length, min(self.components, dims) + 1), dtype=np.float32),
+               'upper_means': np.zeros(segment_shape, dtype=np.float32),
+               'lower_means': np.zeros(segment_shape, dtype=np.float32)}
+        for name, array in new.items():
+            if getattr(self, name) is not None:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.templates = self._frames[..., :-1]
+        for name in ('labels', 'clusters'):
+            array = np.zeros(capacity, dtype=np.int64)
+            array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+
+    def _segment_means(self, features):
+        return features.reshape(features.shape[:-2] + (self.segments, -1, features.shape[-1])).mean(axis=-2)
+
+    def _fit_axes(self, samples=4096):
+        """ Principal axes of (at most `samples` of) the template frames, and every template projected on them. """
+        frames = self.templates[:self.count].reshape(-1, self.templates.shape[-1])
+        frames = frames[::max(1, len(frames) // samples)].astype(np.float64)
+        frames -= frames.mean(axis=0)
+        axes = np.linalg.svd(frames.T @ frames)[2]  # All D axes even from fewer frames, without the [N, N] factor
+        self.axes = axes[:self._projected.shape[-1] - 1]
+        self._fitted = self.count
+        self._projected[:self.count] = with_norms(self.templates[:self.count] @ self.axes.T)
+
+    def _points(self, templates):
+        """ Projected frames of templates as flat vectors, the space the clusters are fitted in. """
+        return self._projected[templates, :, :-1].reshape(-1, self.length * (self._projected.shape[-1] - 1))
+
+    def _nearest_centroids(self, points, centroid_points):
+        distances = np.einsum('ij,ij->i', centroid_points, centroid_points) - 2 * points @ centroid_points.T
+        return distances.argmin(axis=1)
+
+    def _fit_clusters(self, iterations=5):
+        """ k-means of the projected templates, started from evenly spaced templates, then the full-frame centroids. """
+        n = self.count
+        points = self._points(slice(0, n))
+        centroid_points = points[np.linspace(0, n - 1, -(-n // self.cluster_size)).astype(np.int64)]
+        for _ in range(iterations + 1):
+            clusters = self._nearest_centroids(points, centroid_points)
+            used, clusters = np.unique(clusters, return_inverse=True)  # Empty clusters are dropped
+            order = np.argsort(clusters, kind='stable')
+            starts = np.searchsorted(clusters[order], np.arange(len(used)))
+            sizes = np.diff(np.append(starts, n))[:, None]
+            centroid_points = np.add.reduceat(points[order], starts, axis=0, dtype=np.float64) / sizes
+            centroid_points = centroid_points.astype(np.float32)
+        # The last means are of the final assignment; the bound needs them on the full frames
+        centroids = np.add.reduceat(self.templates[order], starts, axis=0, dtype=np.float64) / sizes[..., None]
+        self.centroids = with_norms(centroids)
+        self._centroid_points = centroid_points
+        self.clusters[:n] = clusters
+        self.radii = np.zeros(self.centroids.shape[:2])
+        self._add_to_clusters(slice(0, n), clusters)
+
+    def _add_to_clusters(self, templates, clusters):
+        """ Widen the radii of the clusters so they cover the given templates' frames. """
+        offsets = self.templates[templates].astype(np.float64) - self.centroids[clusters, :, :-1]
+        np.maximum.at(self.radii, clusters, np.sqrt(np.einsum('ijk,ijk->ij', offsets, offsets)))
+
+    def add_features(self, features, labels):
+        """ Add [N, L, D] template features with their label ids. """
+        features = np.asarray(features, dtype=np.float32)
+        self._grow(self.count + len(features), features.shape[1:])
+        upper, lower = envelope(features, self.radius)
+        new = slice(self.count, self.count + len(features))
+        self._frames[new] = with_norms(features)
+        self.upper_means[new] = self._segment_means(upper)
+        self.lower_means[new] = self._segment_means(lower)
+        self.labels[new] = labels
+        self.count += len(features)
+        if self.count >= 2 * self._fitted:
+            self._fit_axes()
+            self._fit_clusters()
+        else:
+            self._projected[new] = with_norms(features @ self.axes.T)
+            self.clusters[new] = self._nearest_centroids(self._points(new), self._centroid_points)
+            self._add_to_clusters(new, self.clusters[new])
+
+    def add(self, keypoints, mask, label):
+        """ Add one [F, 2, 21, 3] sequence as a template of label (a label_mapping id). """
+        self.add_features(frame_features([keypoints], [mask], self.length), [label])
+
+    def query_features(self, query, k=1):
+        """ The k nearest templates of one [L, D] feature sequence, as a list of (distance, template id). """
+        self.stats['queries'] += 1
+        n = self.count
+        if n == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        # Lower bound 1: cluster_bound(), shared by all templates of a cluster
+        bounds = cluster_bound(query, self.centroids, self.radii, self.radius)[self.clusters[:n]]
+        order = np.argsort(bounds)
+        query_means = self._segment_means(query)
+        projected_query = (query @ self.axes.T).astype(np.float32)
+
+        best = []  # Sorted (distance, id) of the k best so far
+        threshold = np.inf
+        bounded = segmented = projected = computed = 0
+        for start in range(0, n, self.chunk):
+            candidates = order[start:start + self.chunk]
+            candidates = candidates[bounds[candidates] < threshold]
+            if not len(candidates):
+                break  # Candidates come in increasing bound order, so the rest cannot win either
+            bounded += len(candidates)
+            if np.isfinite(threshold):
+                # Lower bound 2: LB_Keogh on segment means, times the frames per segment
+                over = np.maximum(query_means - self.upper_means[candidates],
+                                  self.lower_means[candidates] - query_means)
+                over = np.maximum(over, 0).reshape(len(candidates), -1)
+                candidates = candidates[(self.length // self.segments) * np.einsum('ij,ij->i', over, over) < threshold]
+            segmented += len(candidates)
+            # Lower bound 3: band_bound() of the projected frames, then in order of it
+            # lower bound 4: band_bound() of the full frames, then DTW
+            band = band_bound(projected_query, self._projected[candidates], self.radius)
+            survivors = np.argsort(band)
+            survivors = survivors[band[survivors] < threshold]
+            survivors, band = candidates[survivors], band[survivors]
+            for first in range(0, len(survivors), self.batch):
+                batch = survivors[first:first + self.batch][band[first:first + self.batch] < threshold]
+                if not len(batch):
+                    break
+                projected += len(batch)
+                batch = batch[band_bound(query, self._frames[batch], self.radius) < threshold]
+                if not len(batch):
+                    continue
+                computed += len(batch)
+                distances = dtw_batch(query, self.templates[batch], self.radius, threshold)
+                for distance, template in zip(distances, batch):
+                    if distance < threshold or len(best) < k:
+                        best.append((float(distance), int(template)))
+                        best.sort()
+                        del best[k:]
+                        if len(best) == k:
+                            threshold = best[-1][0]
+        self.stats['pruned_cluster_bound'] += n - bounded
+        self.stats['pruned_segment_bound'] += bounded - segmented
+        self.stats['pruned_projected_bound'] += segmented - projected
+        self.stats['pruned_band_bound'] += projected - computed
+        self.stats['dtw'] += computed
+        return [item for item in best if np.isfinite(item[0])]
+
+    def query(self, keypoints, mask, k=1):
+        """ The k nearest templates of a [F, 2, 21, 3] sequence, as (label, distance, template id). """
+        nearest = self.query_features(frame_features([keypoints], [mask], self.length)[0], k)
+        return [(int(self.labels[template]), distance, template) for distance, template in nearest]
+
+    def __call__(self, keypoints, mask):
+        """ Return (label index, score) of the nearest template; score is 1 / (1 + distance per frame). """
+        nearest = self.query(keypoints, mask)
+        if not nearest:
+            return -1, 0.0
+        label, distance, template = nearest[0]
+        return label, 1.0 / (1.0 + distance / self.length)
+
+    def save(self, path):
+        np.savez(path, templates=self.templates[:self.count], labels=self.labels[:self.count], length=self.length,
+                 radius=self.radius, segments=self.segments, components=self.components)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model:
+            index = cls(int(model['length']), int(model['radius']), int(model['segments']), int(model['components']))
+            index.add_features(model['templates'], model['labels'])
+        return index
+
+    @classmethod
+    def from_store(cls, store_path, indices=None, **options):
+        """ Build an index with every video (or the given videos) of a known gesture in a keypoint store. """
+        store = KeypointStore(store_path)
+        index = cls(**options)
+        keypoints_list, mask_list, labels = [], [], []
+        for i in range(len(store)) if indices is None else indices:
+            gesture = store.videos[i]['gesture']
+            if gesture in label_mapping:
+                keypoints, mask = store[i]
+                keypoints_list.append(keypoints)
+                mask_list.append(mask)
+                labels.append(label_mapping[gesture])
+        if labels:
+            index.add_features(frame_features(keypoints_list, mask_list, index.length), labels)
+        return index
+
+def brute_force(index, query):
+    """ Exact nearest template by DTW against every template, for checking the pruned search. """
+    distances = dtw_batch(query, index.templates[:index.count], index.radius)
+    best = int(np.argmin(distances))
+    return float(distances[best]), best
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a DTW template index from a keypoint store and test it.")
+    parser.add_argument('store', help="keypoint store of the template videos")
+    parser.add_argument('--split', help="split .npz from video_split.py, a stratified 80/20 split if omitted")
+    parser.add_argument('--output', default='dtw_index.npz')
+    parser.add_argument('--length', type=int, default=32, help="frames per resampled sequence")
+    parser.add_argument('--radius', type=int, default=3, help="Sakoe-Chiba band radius in frames")
+    args = parser.parse_args()
+
+    store = KeypointStore(args.store)
+    if args.split:
+        train, test = load_split(args.split, store)
+    else:
+        gestures = np.array([entry['gesture'] for entry in store.videos], dtype=str)
+        train, test = stratified_split(np.unique(gestures, return_inverse=True)[1])
+
+    start = time.perf_counter()
+    index = DTWIndex.from_store(args.store, train, length=args.length, radius=args.radius)
+    index.save(args.output)
+    print(f"Indexed {len(index)} templates in {time.perf_counter() - start:.2f} s, saved to '{args.output}'.")
+
+    correct = total = 0
+    timings = []
+    for i in test:
+        gesture = store.videos[i]['gesture']
+        if gesture not in label_mapping:
+            continue
+        keypoints, mask = store[i]
+        start = time.perf_counter()
+        label, score = index(keypoints, mask)
+        timings.append((time.perf_counter() - start) * 1000)
+        correct += label == label_mapping[gesture]
+        total += 1
+    if total:
+        print(f"Test accuracy: {100 * correct / total:.1f}% on {total} videos, "
+              f"query p50 {np.median(timings):.2f} ms, p95 {np.percentile(timings, 95):.2f} ms")
+    stats = index.stats
+    print(f"Per query: {stats['dtw'] / max(stats['queries'], 1):.1f} DTW computations, "
+          f"{stats['pruned_cluster_bound'] / max(stats['queries'], 1):.1f} pruned by the cluster bound, "
+          f"{stats['pruned_segment_bound'] / max(stats['queries'], 1):.1f} by the segment bound, "
+          f"{stats['pruned_projected_bound'] / max(stats['queries'], 1):.1f} by the projected band bound, "
+          f"{stats['pruned_band_bound'] / max(stats['queries'], 1):.1f} by the full one.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import zipfile
+import argparse
+import numpy as np
+
+CACHE_VERSION = 3  # Bump when the extraction output changes, so old entries stop matching
+ENTRY_SUFFIX = '.npz'
+HASHES_FILE = 'file_hashes.json'  # path -> (size, mtime, digest), to skip re-hashing unchanged videos
+
+def file_digest(path, chunk_size=1 << 20):
+    """ SHA-256 of a file's content. """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """ Per-video keypoint cache keyed by video content and extraction parameters.
+
+    Every entry is one .npz file named after its key. Hits refresh the file's mtime,
+    and when max_bytes is set the least recently used entries are evicted first.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._hashes_path = os.path.join(cache_dir, HASHES_FILE)
+        self._hashes = {}
+        if os.path.exists(self._hashes_path):
+            with open(self._hashes_path, 'r') as f:
+                self._hashes = json.load(f)
+        self._hashes_dirty = False
+
+    def video_digest(self, video_path):
+        """ Content hash of a video, reused while its size and mtime are unchanged. """
+        video_path = os.path.abspath(video_path)
+        stat = os.stat(video_path)
+        known = self._hashes.get(video_path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        digest = file_digest(video_path)
+        self._hashes[video_path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self._hashes_dirty = True
+        return digest
+
+    def key(self, video_path, params):
+        """ Cache key of a video for the given extraction parameters. """
+        payload = json.dumps({'version': CACHE_VERSION, 'video': self.video_digest(video_path), 'params': params},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def contains(self, key):
+        """ Whether key has a cached result, without loading it. Also marks the entry as recently used. """
+        path = self._entry_path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    def get(self, key):
+        """ Return the cached result for key, or None. A corrupted entry is deleted and counts as a miss. """
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as entry:
+                result = {name: entry[name] for name in entry.files}
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            # Truncated or corrupted, e.g. by a crash or a full disk; the caller extracts it again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        os.utime(path)  # Mark as recently used
+        return result
+
+    def put(self, key, result):
+        """ Store a result atomically, then evict old entries if the cache is over its size cap. """
+        path = self._entry_path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **result)
+        os.replace(tmp_path, path)
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    def entries(self):
+        """ List (path, size, mtime) of all cache entries. """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(ENTRY_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def evict(self, max_bytes):
+        """ Delete least recently used entries until the cache is at most max_bytes. """
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for path, size, mtime in entries)
+        removed = 0
+        for path, size, mtime in entries:
+            if total <= max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def prune(self, keep_keys):
+        """ Delete every entry whose key is not in keep_keys, and forget hashes of deleted videos. """
+        keep_files = {key + ENTRY_SUFFIX for key in keep_keys}
+        removed = 0
+        for path, size, mtime in self.entries():
+            if os.path.basename(path) not in keep_files:
+                os.remove(path)
+                removed += 1
+        for video_path in list(self._hashes):
+            if not os.path.exists(video_path):
+                del self._hashes[video_path]
+                self._hashes_dirty = True
+        self.save()
+        return removed
+
+    def save(self):
+        """ Persist the video hash table. """
+        if not self._hashes_dirty:
+            return
+        with open(self._hashes_path + '.tmp', 'w') as f:
+            json.dump(self._hashes, f)
+        os.replace(self._hashes_path + '.tmp', self._hashes_path)
+        self._hashes_dirty = False
+
+def extraction_params(max_frames=200, max_num_hands=2, min_detection_confidence=0.5, sampling=None, inference=None):
+    """ The parameters that change extraction output and so are part of the cache key. """
+    params = {'max_frames': max_frames, 'max_num_hands': max_num_hands,
+              'min_detection_confidence': min_detection_confidence, 'sampling': sampling or {}}
+    if inference:
+        params['inference'] = inference  # Only when set, so full-resolution keys stay as they were
+    return params
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the per-video keypoint extraction cache.")
+    parser.add_argument('command', choices=['prune', 'evict', 'stats'])
+    parser.add_argument('--cache-dir', default='extraction_cache')
+    parser.add_argument('--dataset', help="videos/ folder, prune keeps only entries of its current videos")
+    parser.add_argument('--max-bytes', type=int, help="size cap for evict")
+    parser.add_argument('--max-frames', type=int, default=200)
+    parser.add_argument('--max-num-hands', type=int, default=2)
+    parser.add_argument('--min-detection-confidence', type=float, default=0.5)
+    parser.add_argument('--stride', type=int)
+    parser.add_argument('--target-fps', type=float)
+    parser.add_argument('--num-frames', type=int)
+    parser.add_argument('--inference-size', type=int, help="max Mediapipe input size the entries were extracted with")
+    parser.add_argument('--crop', action='store_true', help="entries were extracted on hand crops, needs --inference-size")
+    args = parser.parse_args()
+
+    cache = ExtractionCache(args.cache_dir)
+    if args.command == 'stats':
+        entries = cache.entries()
+        print(f"{len(entries)} entries, {sum(size for path, size, mtime in entries) / (1024 * 1024):.1f} MB")
+    elif args.command == 'evict':
+        if args.max_bytes is None:
+            parser.error("evict needs --max-bytes")
+        print(f"Evicted {cache.evict(args.max_bytes)} entries.")
+    else:
+        if args.dataset is None:
+            parser.error("prune needs --dataset")
+        from video_keypoints import list_videos
+        sampling = {name: value for name, value in (('stride', args.stride), ('target_fps', args.target_fps),
+                                                    ('num_frames', args.num_frames)) if value is not None}
+        if args.crop and not args.inference_size:
+            parser.error("--crop needs --inference-size")
+        # The InferenceInput options as the extraction scripts pass them, so the keys match
+        inference = {'max_size': args.inference_size, 'crop': args.crop} if args.inference_size else None
+        params = extraction_params(args.max_frames, args.max_num_hands, args.min_detection_confidence, sampling,
+                                   inference)
+        keep_keys = {cache.key(video_path, params) for category, gesture, video_path in list_videos(args.dataset)}
+        print(f"Pruned {cache.prune(keep_keys)} stale entries.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import cv2
+import numpy as np
+
+class InferenceInput:
+    """ Turns BGR frames into the RGB image given to hands.process, optionally smaller.
+
+    max_size caps the longer side of the inference image; frames are shrunk with
+    INTER_AREA before the colour conversion, so cvtColor only touches the small image.
+    With crop=True (which needs max_size) the image is a square around the hands found in
+    the previous frame, `margin` of their size on every side, resized to max_size x max_size;
+    when no hand was found the whole frame is used again. The resize and colour buffers are
+    allocated once per image size and reused across frames.
+
+    to_frame() maps the landmarks of the results back into normalized coordinates of the
+    full frame, so callers (draw_landmarks, the keypoint arrays) see no difference.
+    """
+
+    def __init__(self, max_size=None, crop=False, margin=0.3):
+        if crop and not max_size:
+            raise ValueError("crop needs max_size")
+        self.max_size = max_size
+        self.crop = crop
+        self.margin = margin
+        self.roi = None  # (x0, y0, width, height) in pixels of the next crop, None for the whole frame
+        self._region = None
+        self._frame_size = None
+        self._resized = None
+        self._rgb = None
+
+    def reset(self):
+        """ Forget the hand position, e.g. at the start of a new video. """
+        self.roi = None
+
+    def prepare(self, frame):
+        """ Return the RGB inference image for a BGR frame. It is overwritten by the next call. """
+        height, width = frame.shape[:2]
+        self._frame_size = (width, height)
+        x0, y0, w, h = self.roi if self.crop and self.roi is not None else (0, 0, width, height)
+        self._region = (x0, y0, w, h)
+        region = frame[y0:y0 + h, x0:x0 + w]
+
+        if self.crop and self.roi is not None:
+            size = (self.max_size, self.max_size)
+        elif self.max_size and max(w, h) > self.max_size:
+            scale = self.max_size / max(w, h)
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        else:
+            size = None
+
+        if size is not None:
+            if self._resized is None or self._resized.shape[1::-1] != size:
+                self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            cv2.resize(region, size, dst=self._resized, interpolation=cv2.INTER_AREA)
+            region = self._resized
+        if self._rgb is None or self._rgb.shape != region.shape:
+            self._rgb = np.empty(region.shape, dtype=np.uint8)
+        cv2.cvtColor(region, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return self._rgb
+
+    def to_frame(self, results):
+        """ Map the landmarks of results from the inference image to the full frame, in place. """
+        width, height = self._frame_size
+        x0, y0, w, h = self._region
+        hands = results.multi_hand_landmarks or []
+        if (x0, y0, w, h) != (0, 0, width, height):
+            for hand_landmarks in hands:
+                for landmark in hand_landmarks.landmark:
+                    landmark.x = (x0 + landmark.x * w) / width
+                    landmark.y = (y0 + landmark.y * h) / height
+                    landmark.z = landmark.z * w / width  # z is on the same scale as x
+        if self.crop:
+            self.roi = self._hands_roi(hands, width, height)
+        return results
+
+    def _hands_roi(self, hands, width, height):
+        """ Square pixel region around all hands plus the margin, kept inside the frame. """
+        if not hands:
+            return None
+        xs = [landmark.x for hand_landmarks in hands for landmark in hand_landmarks.landmark]
+        ys = [landmark.y for hand_landmarks in hands for landmark in hand_landmarks.landmark]
+        left, right = min(xs) * width, max(xs) * width
+        top, bottom = min(ys) * height, max(ys) * height
+        side = max(right - left, bottom - top) * (1 + 2 * self.margin)
+        side = int(min(max(side, 32), width, height))
+        x0 = int(np.clip((left + right - side) / 2, 0, width - side))
+        y0 = int(np.clip((top + bottom - side) / 2, 0, height - side))
+        return (x0, y0, side, side)
+
+    def process(self, hands, frame):
+        """ hands.process on the prepared image, with the landmarks mapped back to the frame. """
+        return self.to_frame(hands.process(self.prepare(frame)))
@@ -0,0 +1,166 @@
+import os
+import re
+import sys
+import json
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+METRICS_ENV = 'GESTURE2SPEECH_METRICS'  # Set to a .jsonl or .prom path to turn metrics on in the scripts
+
+def peak_rss_mb(children=False):
+    """ Peak resident memory of this process in MB, or None where the platform cannot report it.
+
+    With children=True it is the peak of the largest finished child process instead, e.g. a pool worker.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)  # Bytes on macOS
+    return peak / 1024  # Kilobytes on Linux
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.seconds)
+
+class _NullTimer:
+    seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+class Metrics:
+    """ Counters, histograms and per-video records, with hooks and file exporters.
+
+    When disabled every call returns right away, so instrumented loops cost next to nothing.
+    Hooks are called as hook(kind, name, value) with kind 'counter', 'observe' or 'video'.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.videos = []
+        self.hooks = []
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook('counter', name, value)
+
+    def observe(self, name, value):
+        if not self.enabled:
+            return
+        self.histograms.setdefault(name, []).append(value)
+        for hook in self.hooks:
+            hook('observe', name, value)
+
+    def timer(self, name):
+        """ Context manager that observes the seconds spent in it under name. """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record_video(self, video, **fields):
+        """ Record per-video stats, e.g. frames_decoded, frames_with_hands, inference_ms, bytes_written. """
+        if not self.enabled:
+            return
+        record = dict(fields, video=video)
+        self.videos.append(record)
+        for hook in self.hooks:
+            hook('video', video, record)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def summary(self):
+        """ Counters plus count/sum/p50/p95/max of every histogram. """
+        histograms = {}
+        for name, values in self.histograms.items():
+            ordered = sorted(values)
+            histograms[name] = {
+                'count': len(ordered),
+                'sum': sum(ordered),
+                'p50': ordered[(len(ordered) - 1) // 2],
+                'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+                'max': ordered[-1],
+            }
+        return {'counters': dict(self.counters), 'histograms': histograms}
+
+    def export_jsonl(self, path):
+        """ Write one JSON object per line: every video record, then the counter and histogram summary. """
+        summary = self.summary()
+        with open(path, 'w') as f:
+            for record in self.videos:
+                f.write(json.dumps(dict(record, type='video')) + '\n')
+            for name, value in summary['counters'].items():
+                f.write(json.dumps({'type': 'counter', 'name': name, 'value': value}) + '\n')
+            for name, stats in summary['histograms'].items():
+                f.write(json.dumps(dict(stats, type='histogram', name=name)) + '\n')
+
+    def export_prometheus(self, path):
+        """ Write counters and histograms (as summaries) in the Prometheus text format. """
+        summary = self.summary()
+        lines = []
+        for name, value in summary['counters'].items():
+            metric = _prometheus_name(name) + '_total'
+            lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+        for name, stats in summary['histograms'].items():
+            metric = _prometheus_name(name)
+            lines += [f'# TYPE {metric} summary',
+                      f'{metric}{{quantile="0.5"}} {stats["p50"]}',
+                      f'{metric}{{quantile="0.95"}} {stats["p95"]}',
+                      f'{metric}_sum {stats["sum"]}',
+                      f'{metric}_count {stats["count"]}']
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def export(self, path):
+        """ Export by file extension: .prom for Prometheus text, anything else as JSON lines. """
+        if path.endswith('.prom'):
+            self.export_prometheus(path)
+        else:
+            self.export_jsonl(path)
+
+def _prometheus_name(name):
+    return 'gesture2speech_' + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+class JsonLinesHook:
+    """ Hook that appends every per-video record to a JSON lines file as it happens. """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, kind, name, value):
+        if kind == 'video':
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(value) + '\n')
+
+# Shared instance used by the preprocessing scripts, off unless GESTURE2SPEECH_METRICS is set
+metrics = Metrics(enabled=bool(os.environ.get(METRICS_ENV)))
+
+def export_metrics():
+    """ Export the shared metrics to the GESTURE2SPEECH_METRICS path, if metrics are on. """
+    if metrics.enabled:
+        metrics.export(os.environ[METRICS_ENV])
+        print(f"Metrics saved to '{os.environ[METRICS_ENV]}'.")
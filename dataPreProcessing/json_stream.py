@@ -0,0 +1,142 @@
+import json
+
+_WHITESPACE = ' \t\r\n'
+
+class _JsonReader:
+    """ Buffered reader that decodes one JSON value at a time from a file. """
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk  # Drop what was already consumed
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill(self.chunk_size):
+                return ''
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch == '' or ch not in chars:
+            raise ValueError(f"expected one of {chars!r} in JSON, got {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number cut at the end of the buffer would still decode, so make sure it is complete
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Value is not complete yet, at least double the buffer so big values are not re-parsed too often
+            self._fill(max(self.chunk_size, len(self.buf) - self.pos))
+
+def iter_json_gestures(json_file, chunk_size=1 << 20):
+    """ Yield (category, gesture, value) from a {category: {gesture: value}} JSON file.
+
+    Only one gesture's value is decoded at a time, so the whole file never has to fit in memory.
+    A category without gestures yields (category, None, None), so copies keep it.
+    """
+    with open(json_file, 'r') as f:
+        reader = _JsonReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            category = reader.value()
+            reader.expect(':')
+            reader.expect('{')
+            if reader.peek() == '}':
+                reader.pos += 1
+                yield category, None, None
+            else:
+                while True:
+                    gesture = reader.value()
+                    reader.expect(':')
+                    yield category, gesture, reader.value()
+                    if reader.expect(',}') == '}':
+                        break
+            if reader.expect(',}') == '}':
+                break
+
+class JsonGestureWriter:
+    """ Write a {category: {gesture: value}} JSON file one gesture at a time.
+
+    Gestures of a category must be added one after another. The output is the same
+    as json.dump() of the whole dict with the same indent, also for categories opened with
+    add_category() and left empty.
+    """
+
+    def __init__(self, f, indent=4):
+        self.f = f
+        self.indent = indent
+        self.category = None
+        self._empty = False  # The open category has no gesture yet
+        self.f.write('{')
+
+    def _newline(self, level):
+        if self.indent is None:
+            return ''
+        return '\n' + ' ' * (self.indent * level)
+
+    def _close_category(self):
+        self.f.write('}' if self._empty else self._newline(1) + '}')
+
+    def add_category(self, category):
+        """ Start the next category; written as {} if no gesture is added to it. """
+        if self.category is not None:
+            self._close_category()
+            self.f.write(', ' if self.indent is None else ',')
+        self.f.write(self._newline(1) + json.dumps(category) + ': {')
+        self.category = category
+        self._empty = True
+
+    def add(self, category, gesture, value):
+        if category != self.category:
+            self.add_category(category)
+        if not self._empty:
+            self.f.write(', ' if self.indent is None else ',')
+        self._empty = False
+        value_json = json.dumps(value, indent=self.indent)
+        if self.indent is not None:
+            value_json = value_json.replace('\n', self._newline(2))
+        self.f.write(self._newline(2) + json.dumps(gesture) + ': ' + value_json)
+
+    def close(self):
+        if self.category is not None:
+            self._close_category()
+            self.f.write(self._newline(0))
+        self.f.write('}')
+
+def normalize_json_stream(json_file, output_file, normalize_fn, indent=4):
+    """ Normalize a keypoints JSON file gesture by gesture with normalize_fn, writing as it goes. """
+    with open(output_file, 'w') as f:
+        writer = JsonGestureWriter(f, indent)
+        for category, gesture, keypoints in iter_json_gestures(json_file):
+            if gesture is None:
+                writer.add_category(category)  # No gestures, kept as an empty category
+            else:
+                writer.add(category, gesture, normalize_fn(keypoints))
+        writer.close()
@@ -0,0 +1,145 @@
+import time
+import argparse
+import numpy as np
+from keypoint_store import KeypointStore, KeypointStoreWriter
+
+CENTER = 0.5  # Mediapipe x and y are in [0, 1], rotate and scale around the image centre
+
+def time_warp(keypoints, mask, rng, copies, strength=0.2, knots=4):
+    """ Replay a [F, 2, 21, 3] sequence at a randomly varying speed, returning [K, F, ...] copies.
+
+    Each copy gets a smooth random speed curve (knots speeds in [1 - strength, 1 + strength]),
+    and frames are linearly interpolated at the warped times. Where a hand is missing in one
+    of the two neighbouring frames the nearest frame is used instead.
+    """
+    frames = len(keypoints)
+    if frames < 2:
+        return np.repeat(keypoints[None], copies, axis=0), np.repeat(mask[None], copies, axis=0)
+
+    # Speed at every frame step, linearly interpolated between the random knots
+    knot_speeds = rng.uniform(1 - strength, 1 + strength, (copies, knots))
+    position = np.linspace(0, knots - 1, frames - 1)
+    left = np.minimum(position.astype(np.int64), knots - 2) if knots > 1 else np.zeros(frames - 1, dtype=np.int64)
+    frac = position - left
+    if knots > 1:
+        speeds = knot_speeds[:, left] * (1 - frac) + knot_speeds[:, left + 1] * frac
+    else:
+        speeds = np.repeat(knot_speeds, frames - 1, axis=1)
+    times = np.concatenate([np.zeros((copies, 1)), np.cumsum(speeds, axis=1)], axis=1)
+    times *= (frames - 1) / times[:, -1:]  # Same start and end as the original
+
+    i0 = np.minimum(np.floor(times).astype(np.int64), frames - 2)
+    i1 = i0 + 1
+    w = (times - i0)[..., None, None, None]
+    nearest = np.where(w[..., 0, 0, 0] < 0.5, i0, i1)
+    both = (mask[i0] & mask[i1])[..., None, None]
+    warped = np.where(both, keypoints[i0] * (1 - w) + keypoints[i1] * w, keypoints[nearest])
+    return warped.astype(keypoints.dtype), mask[nearest]
+
+def mirror(keypoints, mask, rng, probability=0.5):
+    """ Mirror copies horizontally with the given probability, swapping the Left and Right hand slots. """
+    flip = rng.random(len(keypoints)) < probability
+    flipped = keypoints[flip][:, :, ::-1].copy()
+    flipped[..., 0] = np.where(mask[flip][:, :, ::-1, None], 1.0 - flipped[..., 0], 0.0)
+    keypoints[flip] = flipped
+    mask[flip] = mask[flip][:, :, ::-1]
+    return keypoints, mask
+
+def affine(keypoints, mask, rng, rotate=(-25, 25), scale=(0.8, 1.2), shear=(-8, 8), translate=(-0.2, 0.2)):
+    """ Apply one random rotate/scale/shear/translate per copy to the x, y of all its frames.
+
+    Angles in degrees. A range of None leaves that part out (no rotation, scale 1, ...).
+    """
+    copies = len(keypoints)
+    theta = np.radians(rng.uniform(*rotate, copies)) if rotate is not None else np.zeros(copies)
+    shear_angle = np.radians(rng.uniform(*shear, copies)) if shear is not None else np.zeros(copies)
+    sx = rng.uniform(*scale, copies) if scale is not None else np.ones(copies)
+    sy = rng.uniform(*scale, copies) if scale is not None else np.ones(copies)
+    shift = rng.uniform(*translate, (copies, 2)) if translate is not None else np.zeros((copies, 2))
+
+    cos, sin, tan = np.cos(theta), np.sin(theta), np.tan(shear_angle)
+    # rotation @ shear @ scale, one 2x2 matrix per copy
+    matrix = np.empty((copies, 2, 2))
+    matrix[:, 0, 0] = cos * sx
+    matrix[:, 0, 1] = (cos * tan - sin) * sy
+    matrix[:, 1, 0] = sin * sx
+    matrix[:, 1, 1] = (sin * tan + cos) * sy
+
+    xy = keypoints[..., :2] - CENTER
+    xy = np.einsum('kij,kfhlj->kfhli', matrix, xy) + CENTER + shift[:, None, None, None, :]
+    keypoints[..., :2] = xy
+    keypoints[..., 2] *= np.sqrt(sx * sy)[:, None, None, None]  # Keep depth in proportion with the hand size
+    keypoints *= mask[..., None, None]  # Missing hands stay all zero
+    return keypoints
+
+def jitter(keypoints, mask, rng, sigma=0.005):
+    """ Add gaussian noise to every landmark of the detected hands. """
+    keypoints += rng.normal(0, sigma, keypoints.shape) * mask[..., None, None]
+    return keypoints
+
+def frame_dropout(keypoints, mask, rng, probability=0.1):
+    """ Drop random frames, as if Mediapipe had found no hands in them. """
+    keep = rng.random(mask.shape[:2]) >= probability
+    mask &= keep[..., None]
+    keypoints *= keep[..., None, None, None]
+    return keypoints, mask
+
+def augment_sequence(keypoints, mask, copies, rng, warp=0.2, mirror_probability=0.5, rotate=(-25, 25),
+                     scale=(0.8, 1.2), shear=(-8, 8), translate=(-0.2, 0.2), sigma=0.005, dropout=0.1):
+    """ Make `copies` augmented versions of a [F, 2, 21, 3] sequence and its [F, 2] mask in one vectorized pass.
+
+    Returns [K, F, 2, 21, 3] keypoints and a [K, F, 2] mask. Every step can be turned off
+    with a zero, and each of the rotate/scale/shear/translate ranges with None.
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    mask = np.asarray(mask, dtype=bool)
+    if warp:
+        out, out_mask = time_warp(keypoints, mask, rng, copies, warp)
+    else:
+        out, out_mask = np.repeat(keypoints[None], copies, axis=0), np.repeat(mask[None], copies, axis=0)
+    if mirror_probability:
+        out, out_mask = mirror(out, out_mask, rng, mirror_probability)
+    if any(value is not None for value in (rotate, scale, shear, translate)):
+        out = affine(out, out_mask, rng, rotate, scale, shear, translate)
+    if sigma:
+        out = jitter(out, out_mask, rng, sigma)
+    if dropout:
+        out, out_mask = frame_dropout(out, out_mask, rng, dropout)
+    return out.astype(np.float32), out_mask
+
+def augment_store(input_path, output_path, copies=10, seed=0, keep_original=True, **options):
+    """ Write every video of a keypoint store plus `copies` augmented versions of it to a new store.
+
+    Augmented videos are named '<video>#aug<k>'. Returns the number of videos written.
+    """
+    rng = np.random.default_rng(seed)
+    store = KeypointStore(input_path)
+    written = 0
+    with KeypointStoreWriter(output_path) as writer:
+        for i, (category, gesture, video, keypoints, mask) in enumerate(store.iter_videos()):
+            frame_indices = store.frame_indices(i)
+            fps = store.videos[i]['fps']
+            if keep_original:
+                writer.add(category, gesture, video, keypoints, mask, frame_indices, fps)
+                written += 1
+            augmented, augmented_mask = augment_sequence(keypoints, mask, copies, rng, **options)
+            for k in range(copies):
+                writer.add(category, gesture, f'{video}#aug{k}', augmented[k], augmented_mask[k], frame_indices, fps)
+            written += copies
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an augmented keypoint store from an extracted one.")
+    parser.add_argument('input', help="keypoint store to augment")
+    parser.add_argument('output', help="new keypoint store")
+    parser.add_argument('--copies', type=int, default=10, help="augmented copies per video")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written = augment_store(args.input, args.output, args.copies, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} videos to '{args.output}' in {elapsed:.2f} s ({written / elapsed:.0f} videos/s).")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+import os
+import json
+import numpy as np
+from json_stream import JsonGestureWriter
+from quantization import QUANTIZATIONS, dequantize, quantize
+
+NUM_LANDMARKS = 21
+HAND_LABELS = ('Left', 'Right')  # Order of the hand slots in a [2, 21, 3] frame array
+FRAME_SHAPE = (2, NUM_LANDMARKS, 3)
+
+KEYPOINTS_FILE = 'keypoints.bin'  # float32 [total_frames, 2, 21, 3], float16 or uint16 codes in quantized stores
+MASK_FILE = 'mask.bin'  # uint8 [total_frames, 2], 1 where the hand was detected
+FRAME_INDICES_FILE = 'frame_indices.bin'  # int32 [total_frames], source frame index of each row
+HANDEDNESS_FILE = 'handedness.bin'  # int8 [total_frames, 2], reported label of each detection in Mediapipe's order
+INDEX_FILE = 'index.json'  # category/gesture/video -> offset and frame count
+
+KEYPOINT_DTYPES = {None: np.float32, 'float16': np.float16, 'uint16': np.uint16}
+
+class KeypointStoreWriter:
+    """ Append videos to a keypoint store one at a time, without holding the dataset in memory.
+
+    quantization='float16' or 'uint16' stores the keypoints in 2 bytes instead of 4 (see
+    quantization.py for the error bounds); uint16 stores keep the per-axis fixed-point
+    range of every video in the index.
+    """
+
+    def __init__(self, path, quantization=None):
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+        self.path = path
+        self.quantization = quantization
+        os.makedirs(path, exist_ok=True)
+        # The data files are rewritten from scratch, so an old index must not describe them
+        # until close() writes the new one
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        self._keypoints_file = open(os.path.join(path, KEYPOINTS_FILE), 'wb')
+        self._mask_file = open(os.path.join(path, MASK_FILE), 'wb')
+        self._frame_indices_file = open(os.path.join(path, FRAME_INDICES_FILE), 'wb')
+        self._handedness_file = open(os.path.join(path, HANDEDNESS_FILE), 'wb')
+        self._videos = []
+        self._frames = 0
+
+    def add(self, category, gesture, video, keypoints, mask, frame_indices=None, fps=None, handedness=None):
+        """ Append one video's [F, 2, 21, 3] keypoints and [F, 2] hand mask.
+
+        frame_indices are the source frame numbers of the rows (0..F-1 if not given) and
+        fps the video's frame rate, so sampled videos keep their real timing. handedness is
+        the [F, 2] detection order of results_to_array(), slot order if not given.
+        """
+        keypoints = np.ascontiguousarray(keypoints, dtype=np.float32).reshape((-1,) + FRAME_SHAPE)
+        mask = np.ascontiguousarray(mask, dtype=np.uint8).reshape(-1, 2)
+        if frame_indices is None:
+            frame_indices = np.arange(len(keypoints))
+        frame_indices = np.ascontiguousarray(frame_indices, dtype=np.int32)
+        if handedness is None:
+            handedness = slot_handedness(mask)
+        handedness = np.ascontiguousarray(handedness, dtype=np.int8).reshape(-1, 2)
+        if not len(keypoints) == len(mask) == len(frame_indices) == len(handedness):
+            raise ValueError(f"{category}/{gesture}/{video}: {len(keypoints)} frames but {len(mask)} mask rows, "
+                             f"{len(frame_indices)} frame indices and {len(handedness)} handedness rows")
+
+        params = None
+        if self.quantization is not None:
+            keypoints, params = quantize(keypoints, self.quantization)
+        keypoints.tofile(self._keypoints_file)
+        mask.tofile(self._mask_file)
+        frame_indices.tofile(self._frame_indices_file)
+        handedness.tofile(self._handedness_file)
+        entry = {
+            'category': category,
+            'gesture': gesture,
+            'video': video,
+            'offset': self._frames,
+            'frames': len(keypoints),
+            'hands': mask.sum(axis=0).tolist(),  # Frames with a Left / Right hand detected
+            'fps': None if fps is None else float(fps),
+        }
+        if params is not None:
+            entry['scale'] = params.tolist()  # (low, step) of x, y, z
+        self._videos.append(entry)
+        self._frames += len(keypoints)
+
+    def _close_files(self):
+        self._keypoints_file.close()
+        self._mask_file.close()
+        self._frame_indices_file.close()
+        self._handedness_file.close()
+
+    def close(self):
+        """ Flush the data files and write the index. """
+        self._close_files()
+        index = {'frame_shape': list(FRAME_SHAPE), 'frames': self._frames, 'videos': self._videos}
+        if self.quantization is not None:
+            index['quantization'] = self.quantization
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(index_path + '.tmp', index_path)  # The store is only valid once the index is in place
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_files()  # No index, so the partial store is never mistaken for a complete one
+
+class KeypointStore:
+    """ Memory-mapped read access to a keypoint store written by KeypointStoreWriter.
+
+    Videos of quantized stores are dequantized to float32 when read; self.keypoints holds
+    the raw codes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.videos = index['videos']
+        self.frames = index['frames']
+        self.quantization = index.get('quantization')
+        self._scales = [np.array(v['scale']) if 'scale' in v else None for v in self.videos]
+
+        dtype = KEYPOINT_DTYPES[self.quantization]
+        if self.frames:
+            self.keypoints = np.memmap(os.path.join(path, KEYPOINTS_FILE), dtype=dtype, mode='r',
+                                       shape=(self.frames,) + FRAME_SHAPE)
+            self.mask = np.memmap(os.path.join(path, MASK_FILE), dtype=np.uint8, mode='r',
+                                  shape=(self.frames, 2))
+            self.indices = np.memmap(os.path.join(path, FRAME_INDICES_FILE), dtype=np.int32, mode='r',
+                                     shape=(self.frames,))
+        else:
+            self.keypoints = np.zeros((0,) + FRAME_SHAPE, dtype=dtype)
+            self.mask = np.zeros((0, 2), dtype=np.uint8)
+            self.indices = np.zeros(0, dtype=np.int32)
+        self._handedness = None  # Stores written before the file existed fall back to slot order
+        if self.frames and os.path.exists(os.path.join(path, HANDEDNESS_FILE)):
+            self._handedness = np.memmap(os.path.join(path, HANDEDNESS_FILE), dtype=np.int8, mode='r',
+                                         shape=(self.frames, 2))
+
+        self._lookup = {(v['category'], v['gesture'], v['video']): i for i, v in enumerate(self.videos)}
+
+    def __len__(self):
+        return len(self.videos)
+
+    def __getitem__(self, i):
+        """ Return (keypoints, mask) of the i-th video, only touching its own pages.
+
+        Both are views into the memory maps, except the keypoints of quantized stores, which
+        are a new float32 array.
+        """
+        entry = self.videos[i]
+        start, stop = entry['offset'], entry['offset'] + entry['frames']
+        keypoints = self.keypoints[start:stop]
+        if self.quantization is not None:
+            keypoints = dequantize(keypoints, self._scales[i])
+        return keypoints, self.mask[start:stop].view(bool)
+
+    def frame_indices(self, i):
+        """ Source frame index of every row of the i-th video. """
+        entry = self.videos[i]
+        return self.indices[entry['offset']:entry['offset'] + entry['frames']]
+
+    def handedness(self, i):
+        """ [F, 2] detection order of the i-th video, see results_to_array(). """
+        entry = self.videos[i]
+        if self._handedness is None:
+            return slot_handedness(self[i][1])
+        return self._handedness[entry['offset']:entry['offset'] + entry['frames']]
+
+    def get(self, category, gesture, video):
+        """ Return (keypoints, mask) views of one video by name. """
+        return self[self._lookup[(category, gesture, video)]]
+
+    def iter_videos(self):
+        """ Yield (category, gesture, video, keypoints, mask) in store order. """
+        for i, entry in enumerate(self.videos):
+            keypoints, mask = self[i]
+            yield entry['category'], entry['gesture'], entry['video'], keypoints, mask
+
+def write_store(path, items, quantization=None):
+    """ Write (category, gesture, video, result) items, e.g. from video_keypoints.iter_dataset(), to a store. """
+    with KeypointStoreWriter(path, quantization) as writer:
+        for category, gesture, video, result in items:
+            writer.add(category, gesture, video, result['keypoints'], result['mask'],
+                       result.get('frame_indices'), result.get('fps'), result.get('handedness'))
+
+def copy_store(input_path, output_path, quantization=None):
+    """ Copy a store video by video, e.g. into a quantized store or back to float32. """
+    store = KeypointStore(input_path)
+    with KeypointStoreWriter(output_path, quantization) as writer:
+        for i, (category, gesture, video, keypoints, mask) in enumerate(store.iter_videos()):
+            writer.add(category, gesture, video, keypoints, mask, store.frame_indices(i), store.videos[i]['fps'],
+                       store.handedness(i))
+
+def slot_handedness(mask):
+    """ [F, 2] int8 handedness of a [F, 2] mask as if Mediapipe had reported the hands in slot order. """
+    mask = np.asarray(mask, dtype=bool).reshape(-1, 2)
+    handedness = np.full(mask.shape, -1, dtype=np.int8)
+    handedness[mask[:, 1], 0] = 1
+    handedness[mask[:, 0], 0] = 0
+    handedness[mask[:, 0] & mask[:, 1], 1] = 1
+    return handedness
+
+def to_hand_entries(keypoints, mask, handedness=None):
+    """ Convert [F, 2, 21, 3] keypoints and a [F, 2] mask to the (handedness, points) list of DoubleHandNorm.
+
+    With the handedness of results_to_array() the hands come in Mediapipe's order and with
+    its labels, as DoubleHandNorm wrote them, even when both hands got the same label.
+    """
+    if handedness is None:
+        handedness = slot_handedness(mask)
+    entries = []
+    for frame_keypoints, labels in zip(np.asarray(keypoints).tolist(), np.asarray(handedness).tolist()):
+        if labels[0] >= 0:
+            taken = [False, False]
+            for label in labels:
+                if label < 0:
+                    break
+                slot = label if not taken[label] else 1 - label  # The slot results_to_array() used
+                taken[slot] = True
+                entries.append((HAND_LABELS[label], frame_keypoints[slot]))
+        else:
+            # No hand detected, append zeros for both hands
+            entries.append(('Left', np.zeros((NUM_LANDMARKS, 3)).tolist()))
+            entries.append(('Right', np.zeros((NUM_LANDMARKS, 3)).tolist()))
+    return entries
+
+def to_legacy_keypoints(dataset):
+    """ Flatten {category: {gesture: {video: result}}} to the {category: {gesture: entries}} layout of keypoints1.json. """
+    keypoints_data = {}
+    for category, gestures in dataset.items():
+        keypoints_data[category] = {}
+        for gesture, videos in gestures.items():
+            entries = []
+            for video in sorted(videos):
+                result = videos[video]
+                entries.extend(to_hand_entries(result['keypoints'], result['mask'], result.get('handedness')))
+            keypoints_data[category][gesture] = entries
+    return keypoints_data
+
+def iter_gesture_entries(items):
+    """ Group (category, gesture, video, result) items by gesture and yield (category, gesture, entries).
+
+    Items must come grouped by gesture, as iter_dataset() and the store yield them, so only
+    one gesture is held in memory at a time.
+    """
+    current = None
+    entries = []
+    for category, gesture, video, result in items:
+        if (category, gesture) != current:
+            if current is not None:
+                yield current[0], current[1], entries
+            current = (category, gesture)
+            entries = []
+        entries.extend(to_hand_entries(result['keypoints'], result['mask'], result.get('handedness')))
+    if current is not None:
+        yield current[0], current[1], entries
+
+def export_json(store, json_file, indent=4):
+    """ Export a store to the nested JSON layout of keypoints1.json, one gesture at a time. """
+    items = ((category, gesture, video, {'keypoints': keypoints, 'mask': mask, 'handedness': store.handedness(i)})
+             for i, (category, gesture, video, keypoints, mask) in enumerate(store.iter_videos()))
+    with open(json_file, 'w') as f:
+        writer = JsonGestureWriter(f, indent)
+        for category, gesture, entries in iter_gesture_entries(items):
+            writer.add(category, gesture, entries)
+        writer.close()
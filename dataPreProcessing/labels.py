@@ -0,0 +1,10 @@
+# Define label mapping based on folder structure
+label_mapping = {
+    "he": 0, "i": 1, "she": 2, "they": 3, "we": 4, "you": 5,
+    "clean": 6, "dirty": 7, "strong": 8, "weak": 9,
+    "boy": 10, "girl": 11,
+    "hospital": 12, "house": 13, "school": 14, "university": 15,
+}
+
+# Label index -> gesture name, the word that gets spoken
+label_names = [name for name, index in sorted(label_mapping.items(), key=lambda item: item[1])]
@@ -0,0 +1,94 @@
+import numpy as np
+from keypoint_store import KeypointStore, KeypointStoreWriter
+
+WRIST = 0  # Landmark index of the wrist
+MIDDLE_MCP = 9  # Landmark index of the middle finger knuckle, wrist to here is the palm size
+
+NORMALIZATION_MODES = ('minmax', 'wrist', 'scale')
+
+def normalize_hands(points, mode='minmax'):
+    """ Normalize a stacked [..., 21, 3] array of hands in one pass and return a new float64 array.
+
+    'minmax' scales every axis of every hand to [0, 1] like normalize_keypoints(); an axis
+    where all points are the same becomes 0.0. 'wrist' moves the wrist to the origin.
+    'scale' also divides by the palm size, so the hand size in the image does not matter.
+    """
+    points = np.array(points, dtype=np.float64)  # Always a copy, the input is left untouched
+    if points.shape[-2:] != (21, 3):
+        raise ValueError(f"expected [..., 21, 3] hands, got shape {points.shape}")
+
+    if mode == 'minmax':
+        min_val = points.min(axis=-2, keepdims=True)
+        range_val = points.max(axis=-2, keepdims=True) - min_val
+        points -= min_val  # An axis with zero range is already all 0.0 after this
+        range_val[range_val <= 0] = 1.0  # so dividing it by 1.0 keeps it at 0.0
+        points /= range_val
+    elif mode == 'wrist':
+        points -= points[..., WRIST:WRIST + 1, :]
+    elif mode == 'scale':
+        points -= points[..., WRIST:WRIST + 1, :]
+        palm_size = np.linalg.norm(points[..., MIDDLE_MCP:MIDDLE_MCP + 1, :], axis=-1, keepdims=True)
+        palm_size[palm_size <= 0] = 1.0  # Degenerate or undetected hand, leave it wrist-relative
+        points /= palm_size
+    else:
+        raise ValueError(f"unknown normalization mode {mode!r}, expected one of {NORMALIZATION_MODES}")
+    return points
+
+class FrameNormalizer:
+    """ Online version of normalize_hands() for the live path: normalizes one frame in place.
+
+    normalize() takes a float64 [hands, 21, 3] buffer and overwrites it with the result of
+    normalize_hands(buffer, mode), bit for bit: the same float64 operations run in the same
+    order, only into scratch arrays allocated once here instead of per frame.
+    """
+
+    def __init__(self, mode='minmax', hands=2):
+        if mode not in NORMALIZATION_MODES:
+            raise ValueError(f"unknown normalization mode {mode!r}, expected one of {NORMALIZATION_MODES}")
+        self.mode = mode
+        self.shape = (hands, 21, 3)
+        self._offset = np.empty((hands, 1, 3))  # Per-axis minimum, or the wrist
+        self._range = np.empty((hands, 1, 3))
+        self._degenerate = np.empty((hands, 1, 3), dtype=bool)
+        self._squares = np.empty((hands, 1, 3))
+        self._palm_size = np.empty((hands, 1, 1))
+        self._palm_degenerate = np.empty((hands, 1, 1), dtype=bool)
+
+    def normalize(self, points):
+        """ Normalize a float64 [hands, 21, 3] array in place and return it. """
+        if points.dtype != np.float64 or points.shape != self.shape:
+            raise ValueError(f"expected a float64 {self.shape} buffer, got {points.dtype} {points.shape}")
+        if self.mode == 'minmax':
+            np.minimum.reduce(points, axis=1, keepdims=True, out=self._offset)  # The ufunc, np.min adds a wrapper
+            np.maximum.reduce(points, axis=1, keepdims=True, out=self._range)
+            np.subtract(self._range, self._offset, out=self._range)
+            np.subtract(points, self._offset, out=points)
+            np.less_equal(self._range, 0, out=self._degenerate)
+            np.copyto(self._range, 1.0, where=self._degenerate)
+            np.divide(points, self._range, out=points)
+        else:
+            np.copyto(self._offset, points[:, WRIST:WRIST + 1, :])
+            np.subtract(points, self._offset, out=points)
+            if self.mode == 'scale':
+                # np.linalg.norm over the last axis is sqrt(add.reduce(x * x)), done here into scratch arrays
+                palm = points[:, MIDDLE_MCP:MIDDLE_MCP + 1, :]
+                np.multiply(palm, palm, out=self._squares)
+                np.add.reduce(self._squares, axis=-1, keepdims=True, out=self._palm_size)
+                np.sqrt(self._palm_size, out=self._palm_size)
+                np.less_equal(self._palm_size, 0, out=self._palm_degenerate)
+                np.copyto(self._palm_size, 1.0, where=self._palm_degenerate)
+                np.divide(points, self._palm_size, out=points)
+        return points
+
+    def normalize_into(self, points, out):
+        """ Copy [hands, 21, 3] points (e.g. float32 landmarks) into the float64 out and normalize it there. """
+        np.copyto(out, points)
+        return self.normalize(out)
+
+def normalize_store(input_path, output_path, mode='minmax', quantization=None):
+    """ Normalize a keypoint store video by video into a new store, so memory stays bounded by one video. """
+    store = KeypointStore(input_path)
+    with KeypointStoreWriter(output_path, quantization) as writer:
+        for i, (category, gesture, video, keypoints, mask) in enumerate(store.iter_videos()):
+            writer.add(category, gesture, video, normalize_hands(keypoints, mode), mask,
+                       store.frame_indices(i), store.videos[i]['fps'], store.handedness(i))
@@ -1,7 +1,20 @@
 import json
 import numpy as np
+from instrumentation import peak_rss_mb
+from json_stream import normalize_json_stream
+from normalization import normalize_hands
+
+def normalize_keypoints(keypoints, mode='minmax'):
+    try:
+        points_array = np.array(keypoints, dtype=np.float64)
+    except ValueError:
+        points_array = None  # Ragged list, hands with different shapes
+    if points_array is not None and points_array.ndim == 3 and points_array.shape[1:] == (21, 3):
+        # Normalize all hands at once as a stacked [N, 21, 3] array
+        return normalize_hands(points_array, mode).tolist()
+    if mode != 'minmax':
+        raise ValueError(f"mode {mode!r} needs [21, 3] hands, only 'minmax' handles other shapes")
 
-def normalize_keypoints(keypoints):
     normalized_keypoints = []
     for points in keypoints:
         points_array = np.array(points)
@@ -31,10 +44,11 @@ def normalize_json_keypoints(json_file):
 
 # Usage
 input_file = r'D:\FINAL_YEAR_PROJECT\Gesture2Speech\keypoints.json'  # Change this to your actual file path
-normalized_data = normalize_json_keypoints(input_file)
 
-# Save the normalized data to a new JSON file
-with open('normalized_keypoints.json', 'w') as f:
-    json.dump(normalized_data, f, indent=4)
+# Normalize one gesture at a time and write it straight to the new JSON file
+normalize_json_stream(input_file, 'normalized_keypoints.json', normalize_keypoints)
 
 print("Normalization complete. Normalized keypoints saved to 'normalized_keypoints.json'.")
+peak_mb = peak_rss_mb()
+if peak_mb is not None:
+    print(f"Peak memory: {peak_mb:.1f} MB")
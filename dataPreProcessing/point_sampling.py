@@ -0,0 +1,56 @@
+import itertools
+import numpy as np
+
+def frames_to_array(keypoints_list, dtype=np.float32):
+    """ Pad a list of frames of [x, y, z] points (any count each) to [N, P, 3] plus the [N] point counts. """
+    counts = np.fromiter(map(len, keypoints_list), dtype=np.int64, count=len(keypoints_list))
+    points = np.zeros((len(counts), int(counts.max(initial=0)), 3), dtype=dtype)
+    if counts.sum():
+        flat = np.array(list(itertools.chain.from_iterable(keypoints_list)), dtype=dtype).reshape(-1, 3)
+        rows = np.repeat(np.arange(len(counts)), counts)
+        cols = np.arange(len(flat)) - np.repeat(np.cumsum(counts) - counts, counts)
+        points[rows, cols] = flat
+    return points, counts
+
+def sample_point_indices(counts, width, ratio=0.7, rng=None):
+    """ Draw int(ratio * count) distinct point indices for every frame at once.
+
+    Returns [N, K] indices with K = int(ratio * width), sorted so kept points stay in their
+    original order, and a [N, K] mask of the kept ones. Unused slots hold `width`.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    counts = np.asarray(counts)
+    keep = (ratio * counts).astype(np.int64)
+    size = int(ratio * width)
+    # Random keys, with padding pushed to the end, so the first `keep` of every argsort are a uniform sample
+    keys = rng.random((len(counts), width))
+    keys[np.arange(width)[None, :] >= counts[:, None]] = np.inf
+    chosen = np.argsort(keys, axis=1)[:, :size]
+    mask = np.arange(size)[None, :] < keep[:, None]
+    return np.sort(np.where(mask, chosen, width), axis=1), mask
+
+def subsample_points(points, counts, ratio=0.7, rng=None):
+    """ Keep int(ratio * count) random points of every frame of a padded [N, P, 3] array.
+
+    counts is the number of valid points per frame. Returns [N, K, 3] points with
+    K = int(ratio * P) and a [N, K] mask of the kept ones; the rest of each row is zero.
+    """
+    width = points.shape[1]
+    chosen, mask = sample_point_indices(counts, width, ratio, rng)
+    sampled = np.take_along_axis(points, np.minimum(chosen, max(width - 1, 0))[..., None], axis=1)
+    sampled *= mask[..., None]
+    return sampled, mask
+
+def subsample_frames(keypoints_list, ratio=0.7, rng=None):
+    """ Sample the points of a list of frames, returning lists again for the JSON layout.
+
+    The indices are drawn with sample_point_indices() and the original point lists are
+    reused, so nothing is converted. Frames left with no points get a single
+    [0.0, 0.0, 0.0] point, as before.
+    """
+    counts = np.fromiter(map(len, keypoints_list), dtype=np.int64, count=len(keypoints_list))
+    chosen, mask = sample_point_indices(counts, int(counts.max(initial=0)), ratio, rng)
+    output_keypoints_list = []
+    for frame, indices, kept in zip(keypoints_list, chosen.tolist(), mask.sum(axis=1).tolist()):
+        output_keypoints_list.append([frame[i] for i in indices[:kept]] if kept else [[0.0, 0.0, 0.0]])
+    return output_keypoints_list
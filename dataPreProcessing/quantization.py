@@ -0,0 +1,133 @@
+import argparse
+import numpy as np
+
+QUANTIZATIONS = ('float16', 'uint16')
+
+UINT16_LEVELS = 65535  # Codes 0..65535 span [low, high] of an axis
+FLOAT16_MAX = 65504.0  # Largest finite float16
+FLOAT16_RELATIVE_ERROR = 2.0 ** -11  # Rounding to 11 significant bits is off by at most half an ulp
+FLOAT16_SUBNORMAL_ERROR = 2.0 ** -25  # Half the float16 ulp below 2^-14, where the spacing stops shrinking
+FLOAT32_ROUNDING = 2.0 ** -22  # Slack for the float32 multiply-add of the uint16 dequantization
+
+def fixed_point_params(values):
+    """ [2, 3] float64 (low, step) per axis of [..., 3] values for uint16 fixed point.
+
+    The codes span the minimum to the maximum of every axis. An axis with a single value
+    gets step 1.0, so all its codes are 0 and it is reconstructed exactly.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1, 3)
+    if not len(values):
+        return np.array([[0.0] * 3, [1.0] * 3])
+    low = values.min(axis=0)
+    step = (values.max(axis=0) - low) / UINT16_LEVELS
+    step[step <= 0] = 1.0
+    return np.stack([low, step])
+
+def quantize(values, quantization, params=None):
+    """ Quantize [..., 3] float values and return (codes, params).
+
+    'float16' codes are the values rounded to float16, params is None. 'uint16' codes are
+    round((value - low) / step) per axis with params = fixed_point_params(values), or the
+    given params, e.g. [[0, 0, 0], [1 / 65535] * 3] for keypoints normalized to [0, 1].
+    """
+    values = np.asarray(values)
+    if quantization == 'float16':
+        if np.abs(values).max(initial=0) > FLOAT16_MAX:
+            raise ValueError(f"values up to {np.abs(values).max()} overflow float16")
+        return values.astype(np.float16), None
+    if quantization == 'uint16':
+        params = fixed_point_params(values) if params is None else np.asarray(params, dtype=np.float64)
+        codes = np.rint((values - params[0]) / params[1])
+        if codes.size and (codes.min() < 0 or codes.max() > UINT16_LEVELS):
+            raise ValueError("values outside the fixed-point range of params")
+        return codes.astype(np.uint16), params
+    raise ValueError(f"unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+
+def dequantize(codes, params=None, out=None):
+    """ float32 values of codes from quantize(), in one vectorized pass (into out if given). """
+    if out is None:
+        out = np.empty(codes.shape, dtype=np.float32)
+    if codes.dtype == np.uint16:
+        np.multiply(codes, params[1].astype(np.float32), out=out)
+        out += params[0].astype(np.float32)
+    else:
+        out[...] = codes
+    return out
+
+def quantized_arrays(name, values, quantization=None):
+    """ {name: values} for ShardWriter.add(), quantized if asked, with the uint16 params under name + '_scale'. """
+    if quantization is None:
+        return {name: values}
+    codes, params = quantize(values, quantization)
+    arrays = {name: codes}
+    if params is not None:
+        arrays[name + '_scale'] = params
+    return arrays
+
+def dequantized_array(arrays, name):
+    """ Array `name` of a ShardReader sample written by quantized_arrays(), as float32 if it was quantized. """
+    values = arrays[name]
+    if values.dtype not in (np.float16, np.uint16):
+        return values
+    return dequantize(values, arrays.get(name + '_scale'))
+
+def error_bound(values, quantization, params=None):
+    """ Largest possible |dequantize(quantize(values)) - values| for every element.
+
+    float16: 2^-11 of the magnitude, or 2^-25 for magnitudes below 2^-14 (subnormals).
+    uint16: half a step of the axis, step = (max - min) / 65535, plus 2^-22 of the
+    magnitude of the axis ends for the float32 dequantization; for [0, 1] data that is
+    7.63e-6 + 2.4e-7.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if quantization == 'float16':
+        return np.maximum(np.abs(values) * FLOAT16_RELATIVE_ERROR, FLOAT16_SUBNORMAL_ERROR)
+    params = fixed_point_params(values) if params is None else np.asarray(params, dtype=np.float64)
+    high = params[0] + params[1] * UINT16_LEVELS
+    bound = params[1] / 2 + FLOAT32_ROUNDING * np.maximum(np.abs(params[0]), np.abs(high))
+    return np.broadcast_to(bound, values.shape)
+
+def check_error_bounds(values, quantization, params=None):
+    """ Round-trip values and return (max error, max error / bound); the ratio must stay <= 1. """
+    values = np.asarray(values)
+    codes, params = quantize(values, quantization, params)
+    error = np.abs(dequantize(codes, params).astype(np.float64) - values)
+    if not error.size:
+        return 0.0, 0.0
+    return float(error.max()), float((error / error_bound(values, quantization, params)).max())
+
+def check_cases(rng, size=200000):
+    """ Yield (name, values, params) cases shaped like raw and normalized landmarks. """
+    raw = rng.random((size, 3)) * [1.4, 1.4, 0.4] - [0.2, 0.2, 0.3]  # x, y slightly off frame, small z
+    yield 'raw landmarks', raw.astype(np.float32), None
+    normalized = rng.random((size, 3))
+    normalized[::97] = np.round(normalized[::97])  # Exact 0.0 and 1.0, as normalize_hands() outputs
+    yield 'normalized [0, 1]', normalized.astype(np.float32), None
+    yield 'normalized, fixed [0, 1] range', normalized.astype(np.float32), [[0.0] * 3, [1.0 / UINT16_LEVELS] * 3]
+    yield 'tiny and subnormal', (rng.standard_normal((size, 3)) * 1e-6).astype(np.float32), None
+    constant = np.zeros((size, 3), dtype=np.float32)
+    constant[:, 1] = 0.5
+    yield 'constant axes', constant, None
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the documented error bounds of the keypoint quantizations.")
+    parser.add_argument('--size', type=int, default=200000, help="points per case")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failed = []
+    for name, values, params in check_cases(np.random.default_rng(args.seed), args.size):
+        for quantization in QUANTIZATIONS:
+            if params is not None and quantization != 'uint16':
+                continue
+            error, ratio = check_error_bounds(values, quantization, params)
+            status = 'ok' if ratio <= 1.0 else 'FAILED'
+            print(f"{name:32s} {quantization:8s} max error {error:.3g}  ({100 * ratio:5.1f}% of the bound)  {status}")
+            if ratio > 1.0:
+                failed.append((name, quantization))
+    if failed:
+        raise SystemExit(f"Error bound exceeded: {failed}")
+    print("All quantization errors within their bounds, at 2 bytes per value instead of 4.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import numpy as np
+from keypoint_store import FRAME_SHAPE, KeypointStore, KeypointStoreWriter
+from quantization import QUANTIZATIONS
+
+RESAMPLING_METHODS = ('linear', 'nearest', 'pad')
+
+def resample_batch(keypoints_list, mask_list, length, method='linear'):
+    """ Map videos of any frame count to `length` frames in one vectorized gather.
+
+    keypoints_list holds [F_i, 2, 21, 3] arrays and mask_list the matching [F_i, 2] hand masks.
+    Returns [N, T, 2, 21, 3] keypoints, a [N, T, 2] hand mask and a [N, T] mask of valid frames.
+
+    'linear' interpolates between the two nearest source frames (or takes the nearest one
+    where a hand is missing in either), 'nearest' picks the nearest source frame, and 'pad'
+    keeps the first T frames and marks the rest invalid, so nothing is repeated.
+    """
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f"unknown resampling method {method!r}, expected one of {RESAMPLING_METHODS}")
+    counts = np.array([len(keypoints) for keypoints in keypoints_list], dtype=np.int64)
+    videos = len(counts)
+    if videos == 0:
+        return (np.zeros((0, length) + FRAME_SHAPE, dtype=np.float32), np.zeros((0, length, 2), dtype=bool),
+                np.zeros((0, length), dtype=bool))
+
+    # All videos back to back, plus one all-zero frame at the end for padding and empty videos
+    flat = np.concatenate([np.asarray(keypoints, dtype=np.float32).reshape((-1,) + FRAME_SHAPE)
+                           for keypoints in keypoints_list] + [np.zeros((1,) + FRAME_SHAPE, dtype=np.float32)])
+    flat_mask = np.concatenate([np.asarray(mask, dtype=bool).reshape(-1, 2) for mask in mask_list]
+                               + [np.zeros((1, 2), dtype=bool)])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    blank = len(flat) - 1
+    t = np.arange(length)
+
+    if method == 'pad':
+        valid = t[None, :] < counts[:, None]
+        index = np.where(valid, offsets[:, None] + t[None, :], blank)
+        return flat[index], flat_mask[index], valid
+
+    # Source position of every output frame, 0 .. F_i - 1
+    scale = np.maximum(counts - 1, 0) / max(length - 1, 1)
+    position = t[None, :] * scale[:, None]
+    valid = np.repeat((counts > 0)[:, None], length, axis=1)
+    last = np.maximum(counts - 1, 0)[:, None]
+    if method == 'nearest':
+        index = np.where(valid, offsets[:, None] + np.minimum(np.rint(position).astype(np.int64), last), blank)
+        return flat[index], flat_mask[index], valid
+
+    i0 = np.minimum(np.floor(position).astype(np.int64), last)
+    i1 = np.minimum(i0 + 1, last)
+    w = (position - i0).astype(np.float32)
+    nearest = np.where(w < 0.5, i0, i1)
+    i0, i1, nearest = (np.where(valid, offsets[:, None] + i, blank) for i in (i0, i1, nearest))
+    both = (flat_mask[i0] & flat_mask[i1])[..., None, None]
+    w = w[..., None, None, None]
+    keypoints = np.where(both, flat[i0] * (1 - w) + flat[i1] * w, flat[nearest])
+    return keypoints, flat_mask[nearest], valid
+
+def resample_sequence(keypoints, mask, length, method='linear'):
+    """ resample_batch() for a single [F, 2, 21, 3] video. Returns [T, 2, 21, 3], [T, 2] and [T]. """
+    keypoints, mask, valid = resample_batch([keypoints], [mask], length, method)
+    return keypoints[0], mask[0], valid[0]
+
+def resample_store(input_path, output_path, length, method='linear', batch_size=256, quantization=None):
+    """ Write a copy of a keypoint store with every video resampled to `length` frames.
+
+    Frames marked invalid by 'pad' are dropped again, so only 'linear' and 'nearest' give a
+    uniform length on disk; 'pad' is meant for in-memory batches.
+    """
+    store = KeypointStore(input_path)
+    with KeypointStoreWriter(output_path, quantization) as writer:
+        for start in range(0, len(store), batch_size):
+            entries = range(start, min(start + batch_size, len(store)))
+            keypoints, mask, valid = resample_batch([store[i][0] for i in entries], [store[i][1] for i in entries],
+                                                    length, method)
+            for k, i in enumerate(entries):
+                entry = store.videos[i]
+                source = store.frame_indices(i)
+                # Source frame of each output frame, so the real timing is still known
+                if method == 'pad':
+                    frame_indices = np.zeros(length)
+                    frame_indices[:min(len(source), length)] = source[:length]
+                elif len(source):
+                    frame_indices = np.interp(np.linspace(0, len(source) - 1, length), np.arange(len(source)),
+                                              source).round()
+                else:
+                    frame_indices = np.zeros(length)
+                writer.add(entry['category'], entry['gesture'], entry['video'], keypoints[k][valid[k]],
+                           mask[k][valid[k]], frame_indices[valid[k]], entry['fps'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Resample every video of a keypoint store to a fixed length.")
+    parser.add_argument('input', help="keypoint store to resample")
+    parser.add_argument('output', help="new keypoint store")
+    parser.add_argument('--length', type=int, default=64, help="frames per video")
+    parser.add_argument('--method', choices=RESAMPLING_METHODS, default='linear')
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, help="store the keypoints in 2 bytes per value")
+    args = parser.parse_args()
+
+    resample_store(args.input, args.output, args.length, args.method, quantization=args.quantization)
+    print(f"Resampled '{args.input}' to {args.length} frames per video in '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
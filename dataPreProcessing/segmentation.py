@@ -0,0 +1,226 @@
+import os
+import argparse
+import cv2
+import numpy as np
+from keypoint_store import KeypointStore, KeypointStoreWriter
+
+def motion_energy(keypoints, mask, fps=30.0, frame_indices=None):
+    """ [F] motion energy of [F, 2, 21, 3] keypoints: mean landmark speed of the fastest hand.
+
+    Speeds are in normalized image units (frame widths/heights) per second, from x and y
+    only (z is much noisier). Only hands seen in a frame and the one before count; the first
+    frame and frames without such a hand have energy 0. frame_indices are the source frame
+    numbers of sampled videos, so the speed uses the real time between rows.
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float32)
+    mask = np.asarray(mask, dtype=bool)
+    energy = np.zeros(len(keypoints))
+    if len(keypoints) < 2:
+        return energy
+    step = keypoints[1:, :, :, :2] - keypoints[:-1, :, :, :2]
+    speed = np.sqrt((step * step).sum(axis=-1)).mean(axis=-1)  # [F - 1, 2]
+    speed *= mask[1:] & mask[:-1]
+    frames = 1 if frame_indices is None else np.maximum(np.diff(np.asarray(frame_indices, dtype=np.int64)), 1)
+    energy[1:] = speed.max(axis=1).astype(np.float64) * fps / frames
+    return energy
+
+class GestureSegmenter:
+    """ Splits a stream of landmark frames into gestures by motion energy, with hysteresis.
+
+    A gesture starts once the smoothed motion_energy() has been at or above start_threshold,
+    with a hand in view, for start_frames frames in a row. It ends once the energy has been
+    below end_threshold, or no hand was seen, for end_frames frames in a row. The gap between
+    the two thresholds keeps jitter around one level from toggling the state.
+
+    A segment is (start, end) in frames pushed so far, end excluded. It starts pre_roll frames
+    before the energy rose, as the smoothing lags the motion, and ends at the first quiet
+    frame. Segments shorter than min_frames are dropped and ones reaching max_frames are
+    cut there. push() keeps its state in arrays allocated once, for the live path.
+    """
+
+    def __init__(self, start_threshold=0.3, end_threshold=0.12, start_frames=3, end_frames=8, min_frames=10,
+                 max_frames=90, pre_roll=3, smoothing=0.5, fps=30.0):
+        if end_threshold > start_threshold:
+            raise ValueError(f"end_threshold {end_threshold} is above start_threshold {start_threshold}")
+        self.start_threshold = start_threshold
+        self.end_threshold = end_threshold
+        self.start_frames = start_frames
+        self.end_frames = end_frames
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.pre_roll = pre_roll
+        self.smoothing = smoothing
+        self.fps = fps
+        self._previous = np.zeros((2, 21, 2), dtype=np.float32)
+        self._previous_mask = np.zeros(2, dtype=bool)
+        self._both = np.zeros(2, dtype=bool)
+        self._step = np.empty((2, 21, 2), dtype=np.float32)
+        self._speed = np.empty((2, 21), dtype=np.float32)
+        self.reset()
+
+    @property
+    def history(self):
+        """ Frames a caller must keep to cut out any segment when push() returns it. """
+        return self.max_frames + self.end_frames + self.pre_roll + self.start_frames
+
+    def reset(self):
+        """ Forget the stream, e.g. at the start of a new video. """
+        self.frame = 0  # Frames seen so far
+        self.energy = 0.0  # Smoothed motion energy
+        self.active = False
+        self.start = None
+        self._run = 0  # Frames in a row meeting the start (idle) or end (active) condition
+        self._last_end = 0
+        self._previous_mask[:] = False
+
+    def push(self, keypoints, mask, frames=1):
+        """ Add the next [2, 21, 3] frame and [2] hand mask. Returns a finished (start, end) segment or None.
+
+        frames is the number of source frames since the previous pushed one, for sampled streams.
+        """
+        np.logical_and(mask, self._previous_mask, out=self._both)
+        energy = 0.0
+        if self._both.any():
+            # Same arithmetic as motion_energy(), so live and offline segments agree
+            np.subtract(keypoints[:, :, :2], self._previous, out=self._step)
+            np.multiply(self._step, self._step, out=self._step)
+            np.add.reduce(self._step, axis=-1, out=self._speed)
+            np.sqrt(self._speed, out=self._speed)
+            speed = self._speed.mean(axis=-1) * self._both
+            energy = float(speed.max()) * self.fps / max(frames, 1)
+        np.copyto(self._previous, keypoints[:, :, :2])
+        np.copyto(self._previous_mask, mask)
+        return self.update(energy, bool(self._previous_mask.any()))
+
+    def update(self, energy, present):
+        """ Advance by one frame of raw motion energy; present is whether a hand is in view. """
+        frame = self.frame
+        self.frame += 1
+        self.energy += self.smoothing * (energy - self.energy)
+        if not self.active:
+            self._run = self._run + 1 if present and self.energy >= self.start_threshold else 0
+            if self._run >= self.start_frames:
+                self.active = True
+                self.start = max(frame - self.start_frames + 1 - self.pre_roll, self._last_end)
+                self._run = 0
+            return None
+
+        self._run = self._run + 1 if not present or self.energy < self.end_threshold else 0
+        if self._run >= self.end_frames:
+            return self._close(frame - self.end_frames + 1)
+        if frame + 1 - self.start >= self.max_frames:
+            segment = self._close(frame + 1)
+            self.active = True  # Still moving, the next segment starts right away
+            self.start = frame + 1
+            return segment
+        return None
+
+    def flush(self):
+        """ End the stream: return the open segment, without its trailing quiet frames, or None. """
+        if not self.active:
+            return None
+        return self._close(self.frame - self._run)
+
+    def _close(self, end):
+        start = self.start
+        self.active = False
+        self.start = None
+        self._run = 0
+        self._last_end = end
+        return (start, end) if end - start >= self.min_frames else None
+
+def segment_sequence(keypoints, mask, fps=30.0, frame_indices=None, **options):
+    """ All (start, end) gesture segments of a recorded [F, 2, 21, 3] sequence, rows of the input.
+
+    Uses the same GestureSegmenter state machine as the live path, fed with motion_energy().
+    """
+    segmenter = GestureSegmenter(fps=fps, **options)
+    present = np.asarray(mask, dtype=bool).any(axis=1)
+    segments = []
+    for energy, hand in zip(motion_energy(keypoints, mask, fps, frame_indices).tolist(), present.tolist()):
+        segment = segmenter.update(energy, hand)
+        if segment is not None:
+            segments.append(segment)
+    segment = segmenter.flush()
+    if segment is not None:
+        segments.append(segment)
+    return segments
+
+def clip_name(video, number):
+    """ File name of the number-th clip cut from a video, e.g. rec.mp4 -> rec_003.mp4. """
+    stem, extension = os.path.splitext(video)
+    return f'{stem}_{number:03d}{extension}'
+
+def cut_video(video_path, ranges, output_paths):
+    """ Write the source frames [first, last] of every range to its own video file, in one pass over the video. """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video {video_path!r}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    writers = {}
+    last = max((last for first, last in ranges), default=-1)
+    index = 0
+    try:
+        while index <= last:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            for clip, (first, end) in enumerate(ranges):
+                if first <= index <= end:
+                    if clip not in writers:
+                        os.makedirs(os.path.dirname(output_paths[clip]) or '.', exist_ok=True)
+                        writers[clip] = cv2.VideoWriter(output_paths[clip], fourcc, fps, size)
+                    writers[clip].write(frame)
+            index += 1
+    finally:
+        cap.release()
+        for writer in writers.values():
+            writer.release()
+
+def cut_store(input_path, output_path, videos_folder=None, clips_folder=None, **options):
+    """ Cut every video of a keypoint store into one video per gesture segment, in a new store.
+
+    Clips keep their category and gesture, are named by clip_name() and their frame indices
+    count from the clip's first source frame. With videos_folder
+    (the dataset the store was extracted from) and clips_folder the matching frames of the
+    source videos are written as clips too, in the same category/gesture layout.
+    Returns the number of clips.
+    """
+    store = KeypointStore(input_path)
+    clips = 0
+    with KeypointStoreWriter(output_path, store.quantization) as writer:
+        for i, (category, gesture, video, keypoints, mask) in enumerate(store.iter_videos()):
+            frame_indices = np.asarray(store.frame_indices(i))
+            fps = store.videos[i]['fps'] or 30.0
+            segments = segment_sequence(keypoints, mask, fps, frame_indices, **options)
+            for number, (start, end) in enumerate(segments):
+                writer.add(category, gesture, clip_name(video, number), keypoints[start:end], mask[start:end],
+                           frame_indices[start:end] - frame_indices[start], fps, store.handedness(i)[start:end])
+            if videos_folder and clips_folder and segments:
+                ranges = [(int(frame_indices[start]), int(frame_indices[end - 1])) for start, end in segments]
+                outputs = [os.path.join(clips_folder, category, gesture, clip_name(video, number))
+                           for number in range(len(segments))]
+                cut_video(os.path.join(videos_folder, category, gesture, video), ranges, outputs)
+            clips += len(segments)
+    return clips
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut long recordings in a keypoint store into per-gesture clips.")
+    parser.add_argument('input', help="keypoint store of the recordings")
+    parser.add_argument('output', help="new keypoint store with one video per gesture")
+    parser.add_argument('--videos', help="dataset folder of the recordings, to also cut the video files")
+    parser.add_argument('--clips', help="folder for the cut video files, needs --videos")
+    parser.add_argument('--start-threshold', type=float, default=0.3, help="motion energy that starts a gesture")
+    parser.add_argument('--end-threshold', type=float, default=0.12, help="motion energy below which it ends")
+    parser.add_argument('--min-frames', type=int, default=10)
+    parser.add_argument('--max-frames', type=int, default=90)
+    args = parser.parse_args()
+
+    clips = cut_store(args.input, args.output, args.videos, args.clips, start_threshold=args.start_threshold,
+                      end_threshold=args.end_threshold, min_frames=args.min_frames, max_frames=args.max_frames)
+    print(f"Cut {len(KeypointStore(args.input))} recordings into {clips} clips in '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
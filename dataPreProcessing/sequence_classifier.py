@@ -0,0 +1,196 @@
+import os
+import time
+import argparse
+import numpy as np
+from keypoint_augmentation import augment_sequence
+from keypoint_store import KeypointStore
+from labels import label_mapping, label_names
+from normalization import normalize_hands
+from resampling import resample_batch
+from video_split import load_split, stratified_split
+
+def sequence_features(keypoints_list, mask_list, length=32, segments=8):
+    """ Fixed-size features of a batch of [F, 2, 21, 3] sequences, as a [B, D] float32 array.
+
+    Every sequence is resampled to `length` frames and cut into `segments` equal parts.
+    Each part contributes the mean min-max normalized shape of both hands, how often each
+    hand is seen and the mean wrist position (the normalization removes where the hands are).
+    """
+    if length % segments:
+        raise ValueError(f"length {length} is not a multiple of segments {segments}")
+    keypoints, mask, valid = resample_batch(keypoints_list, mask_list, length)
+    batch = len(keypoints)
+    shape = normalize_hands(keypoints) * mask[..., None, None]
+    parts = (batch, segments, length // segments)
+    features = [shape.reshape(parts + (-1,)).mean(axis=2),
+                mask.reshape(parts + (2,)).mean(axis=2),
+                keypoints[..., 0, :2].reshape(parts + (4,)).mean(axis=2)]
+    return np.concatenate(features, axis=2).reshape(batch, -1).astype(np.float32)
+
+class SequenceClassifier:
+    """ Small MLP over sequence_features(), trained and run with NumPy only.
+
+    Weights, feature scaling and the label ids (indices of label_mapping) of the outputs are
+    saved to one .npz archive. Calling the classifier on a [T, 2, 21, 3] window returns
+    (label, score) like realtime.CentroidClassifier, so it plugs into GestureToSpeech.
+    """
+
+    def __init__(self, weights, labels, length=32, segments=8):
+        self.weights = {name: np.asarray(value, dtype=np.float32) for name, value in weights.items()}
+        self.labels = np.asarray(labels)
+        self.length = int(length)
+        self.segments = int(segments)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model:
+            weights = {name: model[name] for name in ('mean', 'std', 'w1', 'b1', 'w2', 'b2')}
+            return cls(weights, model['labels'], model['length'], model['segments'])
+
+    def save(self, path):
+        np.savez(path, labels=self.labels, length=self.length, segments=self.segments, **self.weights)
+
+    def logits(self, features):
+        w = self.weights
+        hidden = np.maximum((features - w['mean']) / w['std'] @ w['w1'] + w['b1'], 0)
+        return hidden @ w['w2'] + w['b2']
+
+    def predict_proba(self, keypoints_list, mask_list):
+        """ Class probabilities of a batch of sequences, [B, classes], columns in the order of self.labels. """
+        logits = self.logits(sequence_features(keypoints_list, mask_list, self.length, self.segments))
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def __call__(self, keypoints, mask):
+        """ Return (label index, score) for a [T, 2, 21, 3] window and its [T, 2] mask. """
+        probabilities = self.predict_proba([keypoints], [mask])[0]
+        best = int(np.argmax(probabilities))
+        return int(self.labels[best]), float(probabilities[best])
+
+    @classmethod
+    def train(cls, keypoints_list, mask_list, labels, length=32, segments=8, hidden=128, epochs=300, batch_size=64,
+              learning_rate=1e-3, weight_decay=1e-4, augment_copies=4, seed=0):
+        """ Fit on sequences with label_mapping ids, with Adam on the softmax cross-entropy. """
+        rng = np.random.default_rng(seed)
+        labels = np.asarray(labels)
+        if augment_copies:
+            # Extra randomly warped, mirrored and jittered copies of every training video
+            extra_keypoints, extra_mask, extra_labels = [], [], []
+            for keypoints, mask, label in zip(keypoints_list, mask_list, labels):
+                augmented, augmented_mask = augment_sequence(keypoints, mask, augment_copies, rng)
+                extra_keypoints.extend(augmented)
+                extra_mask.extend(augmented_mask)
+                extra_labels.extend([label] * augment_copies)
+            keypoints_list = list(keypoints_list) + extra_keypoints
+            mask_list = list(mask_list) + extra_mask
+            labels = np.concatenate([labels, extra_labels]).astype(labels.dtype)
+
+        features = sequence_features(keypoints_list, mask_list, length, segments)
+        classes, targets = np.unique(labels, return_inverse=True)
+        mean = features.mean(axis=0)
+        std = features.std(axis=0) + 1e-6
+        x = (features - mean) / std
+
+        params = {'w1': rng.normal(0, np.sqrt(2 / x.shape[1]), (x.shape[1], hidden)).astype(np.float32),
+                  'b1': np.zeros(hidden, dtype=np.float32),
+                  'w2': rng.normal(0, np.sqrt(1 / hidden), (hidden, len(classes))).astype(np.float32),
+                  'b2': np.zeros(len(classes), dtype=np.float32)}
+        moments = {name: (np.zeros_like(value), np.zeros_like(value)) for name, value in params.items()}
+        step = 0
+        for epoch in range(epochs):
+            order = rng.permutation(len(x))
+            for start in range(0, len(x), batch_size):
+                batch = order[start:start + batch_size]
+                xb, yb = x[batch], targets[batch]
+                pre = xb @ params['w1'] + params['b1']
+                h = np.maximum(pre, 0)
+                logits = h @ params['w2'] + params['b2']
+                logits -= logits.max(axis=1, keepdims=True)
+                p = np.exp(logits)
+                p /= p.sum(axis=1, keepdims=True)
+                p[np.arange(len(batch)), yb] -= 1  # d(cross-entropy)/d(logits), times the batch size
+                p /= len(batch)
+                dh = (p @ params['w2'].T) * (pre > 0)
+                grads = {'w2': h.T @ p, 'b2': p.sum(axis=0), 'w1': xb.T @ dh, 'b1': dh.sum(axis=0)}
+                step += 1
+                for name, grad in grads.items():
+                    if name[0] == 'w':
+                        grad = grad + weight_decay * params[name]
+                    m, v = moments[name]
+                    m *= 0.9
+                    m += 0.1 * grad
+                    v *= 0.999
+                    v += 0.001 * grad * grad
+                    m_hat = m / (1 - 0.9 ** step)
+                    v_hat = v / (1 - 0.999 ** step)
+                    params[name] -= (learning_rate * m_hat / (np.sqrt(v_hat) + 1e-8)).astype(np.float32)
+        return cls(dict(params, mean=mean, std=std), classes, length, segments)
+
+def load_labelled_videos(store, indices):
+    """ Keypoints, masks and label_mapping ids of the given store videos, skipping unknown gestures. """
+    keypoints_list, mask_list, labels = [], [], []
+    for i in indices:
+        gesture = store.videos[i]['gesture']
+        if gesture not in label_mapping:
+            continue
+        keypoints, mask = store[i]
+        keypoints_list.append(np.array(keypoints))
+        mask_list.append(np.array(mask))
+        labels.append(label_mapping[gesture])
+    return keypoints_list, mask_list, np.array(labels, dtype=np.int64)
+
+def evaluate(classifier, keypoints_list, mask_list, labels, window=30, repeats=200):
+    """ Accuracy on whole videos, plus the median and p95 latency of classifying one window, in ms. """
+    if len(labels):
+        predicted = classifier.labels[np.argmax(classifier.predict_proba(keypoints_list, mask_list), axis=1)]
+        accuracy = float((predicted == labels).mean())
+    else:
+        accuracy = None
+    rng = np.random.default_rng(0)
+    keypoints = rng.random((window, 2, 21, 3)).astype(np.float32)
+    mask = np.ones((window, 2), dtype=bool)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        classifier(keypoints, mask)
+        timings.append((time.perf_counter() - start) * 1000)
+    return accuracy, float(np.median(timings)), float(np.percentile(timings, 95))
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the NumPy gesture classifier on a keypoint store.")
+    parser.add_argument('store', help="keypoint store of the training videos")
+    parser.add_argument('--split', help="split .npz from video_split.py, a stratified 80/20 split if omitted")
+    parser.add_argument('--output', default='gesture_classifier.npz')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--hidden', type=int, default=128)
+    parser.add_argument('--augment-copies', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    store = KeypointStore(args.store)
+    if args.split:
+        train, test = load_split(args.split, store)
+    else:
+        gestures = np.array([entry['gesture'] for entry in store.videos], dtype=str)
+        train, test = stratified_split(np.unique(gestures, return_inverse=True)[1], seed=args.seed)
+
+    start = time.perf_counter()
+    train_keypoints, train_mask, train_labels = load_labelled_videos(store, train)
+    if not len(train_labels):
+        raise ValueError(f"No videos of a known gesture in {args.store}")
+    classifier = SequenceClassifier.train(train_keypoints, train_mask, train_labels, hidden=args.hidden,
+                                          epochs=args.epochs, augment_copies=args.augment_copies, seed=args.seed)
+    classifier.save(args.output)
+    print(f"Trained on {len(train_labels)} videos in {time.perf_counter() - start:.1f} s, "
+          f"classes: {', '.join(label_names[label] for label in classifier.labels)}.")
+
+    test_keypoints, test_mask, test_labels = load_labelled_videos(store, test)
+    accuracy, latency_ms, latency_p95_ms = evaluate(classifier, test_keypoints, test_mask, test_labels)
+    if accuracy is not None:
+        print(f"Test accuracy: {100 * accuracy:.1f}% on {len(test_labels)} videos")
+    print(f"Single window latency: {latency_ms:.2f} ms (p95 {latency_p95_ms:.2f} ms)")
+    print(f"Model size: {os.path.getsize(args.output) / 1024:.1f} KB, saved to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
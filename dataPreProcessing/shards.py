@@ -0,0 +1,150 @@
+import os
+import json
+import mmap
+import zlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from instrumentation import metrics
+
+SHARDS_VERSION = 1
+INDEX_FILE = 'index.json'
+
+def _shard_name(shard_id):
+    return f'shard-{shard_id:05d}'
+
+def _write_atomic(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+def _write_shard(path, shard_id, samples, level):
+    """ Compress every sample on its own and write one shard plus its index. Returns the shard's index entry. """
+    blobs = []
+    entries = []
+    offset = 0
+    for label, video, arrays in samples:
+        blob = zlib.compress(b''.join(np.ascontiguousarray(array).tobytes() for array in arrays.values()), level)
+        frames = len(next(iter(arrays.values()))) if arrays else 0
+        entries.append({'label': label, 'video': video, 'frames': frames, 'offset': offset, 'size': len(blob),
+                        'arrays': {name: [array.dtype.str, list(array.shape)] for name, array in arrays.items()}})
+        blobs.append(blob)
+        offset += len(blob)
+    name = _shard_name(shard_id)
+    _write_atomic(os.path.join(path, name + '.bin'), b''.join(blobs))
+    _write_atomic(os.path.join(path, name + '.json'), json.dumps(entries).encode('utf-8'))
+    return {'name': name, 'samples': len(entries), 'bytes': offset}
+
+class ShardWriter:
+    """ Pack (label, video, arrays) samples into zlib-compressed shards of a fixed sample count.
+
+    Each sample is compressed on its own, so a reader can fetch one sample without
+    decompressing its whole shard. Full shards are compressed and written on a thread pool
+    (zlib releases the GIL), at most workers of them queued at once so a fast producer does not
+    hold the whole dataset in memory. Every file is written atomically, and the top-level index is
+    only written by close(), so a half-written output is never mistaken for a complete one.
+    """
+
+    def __init__(self, path, samples_per_shard=256, workers=4, level=6):
+        self.path = path
+        self.samples_per_shard = samples_per_shard
+        self.workers = workers
+        self.level = level
+        os.makedirs(path, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._shards = []  # Index entries of the written shards, in order
+        self._pending = deque()  # Futures of the shards being written, oldest first
+        self._samples = []
+
+    def add(self, label, video, **arrays):
+        """ Queue one sample, e.g. add('Pronouns/he', 'vid0.avi', keypoints=..., mask=...). """
+        self._samples.append((label, video, {name: np.asarray(array) for name, array in arrays.items()}))
+        if len(self._samples) == self.samples_per_shard:
+            self._flush()
+
+    def _flush(self):
+        if self._samples:
+            shard_id = len(self._shards) + len(self._pending)
+            self._pending.append(self._executor.submit(_write_shard, self.path, shard_id, self._samples, self.level))
+            self._samples = []
+        while len(self._pending) > self.workers:
+            self._settle_oldest()
+
+    def _settle_oldest(self):
+        # Metrics are recorded here, on the caller's thread, as Metrics is not thread-safe
+        shard = self._pending.popleft().result()
+        metrics.count('shards_written')
+        metrics.count('shard_bytes_written', shard['bytes'])
+        self._shards.append(shard)
+
+    def close(self):
+        """ Write the last shard, wait for all of them and write the top-level index. """
+        self._flush()
+        while self._pending:
+            self._settle_oldest()
+        self._executor.shutdown()
+        shards = self._shards
+        index = {'version': SHARDS_VERSION, 'samples': sum(shard['samples'] for shard in shards), 'shards': shards}
+        _write_atomic(os.path.join(self.path, INDEX_FILE), json.dumps(index, indent=4).encode('utf-8'))
+        return index['samples']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(cancel_futures=True)
+
+class ShardReader:
+    """ Random access to the samples of a ShardWriter output. Safe to share between threads. """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.shards = index['shards']
+        self.entries = []
+        self._shard_of = []
+        for shard_id, shard in enumerate(self.shards):
+            with open(os.path.join(path, shard['name'] + '.json'), 'r') as f:
+                entries = json.load(f)
+            self.entries.extend(entries)
+            self._shard_of.extend([shard_id] * len(entries))
+        self._maps = [None] * len(self.shards)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _map(self, shard_id):
+        if self._maps[shard_id] is None:
+            with self._lock:
+                if self._maps[shard_id] is None:
+                    with open(os.path.join(self.path, self.shards[shard_id]['name'] + '.bin'), 'rb') as f:
+                        self._maps[shard_id] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._maps[shard_id]
+
+    def get(self, i):
+        """ Return (label, video, {name: array}) of sample i, decompressing only that sample. """
+        entry = self.entries[i]
+        data = zlib.decompress(self._map(self._shard_of[i])[entry['offset']:entry['offset'] + entry['size']])
+        arrays = {}
+        start = 0
+        for name, (dtype, shape) in entry['arrays'].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(data, dtype, count, start).reshape(shape)
+            start += count * dtype.itemsize
+        return entry['label'], entry['video'], arrays
+
+    def __getitem__(self, i):
+        return self.get(i)
+
+    def close(self):
+        for shard_map in self._maps:
+            if shard_map is not None:
+                shard_map.close()
+        self._maps = [None] * len(self.shards)
@@ -0,0 +1,278 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import mediapipe as mp
+import numpy as np
+from catalog import load_catalog
+from extraction_cache import ExtractionCache, extraction_params
+from inference_input import InferenceInput
+from instrumentation import export_metrics, metrics
+from keypoint_store import NUM_LANDMARKS, HAND_LABELS, KeypointStore, export_json, write_store
+
+mp_hands = mp.solutions.hands
+mp_drawing = mp.solutions.drawing_utils  # For drawing landmarks on exported frames
+
+HAND_SLOTS = {label: slot for slot, label in enumerate(HAND_LABELS)}  # Slot of each hand in a [2, 21, 3] frame array
+
+_worker_hands = None  # Hands instance owned by each process pool worker
+
+def create_hands(max_num_hands=2, min_detection_confidence=0.5):
+    """ Create a Mediapipe Hands instance with the same settings convert() uses. """
+    return mp_hands.Hands(static_image_mode=False, max_num_hands=max_num_hands,
+                          min_detection_confidence=min_detection_confidence)
+
+def results_to_array(results, out, mask, handedness=None):
+    """ Write Mediapipe Hands results into a [2, 21, 3] frame array and a [2] hand mask.
+
+    A hand goes to the slot of its reported label. Mediapipe often labels both hands of a
+    two-hand sign the same, so then the second one takes the free slot. handedness, an
+    optional [2] int8 array, gets the reported label id of each detection in Mediapipe's
+    order (-1 for none), which to_hand_entries() needs to rebuild DoubleHandNorm's output.
+    """
+    out[:] = 0.0
+    mask[:] = False
+    if handedness is not None:
+        handedness[:] = -1
+    if not results.multi_hand_landmarks:
+        return
+    detections = list(zip(results.multi_hand_landmarks, results.multi_handedness))[:2]  # One per slot
+    for detection, (hand_landmarks, hand) in enumerate(detections):
+        label = HAND_SLOTS[hand.classification[0].label]  # 'Left' or 'Right'
+        slot = label if not mask[label] else 1 - label
+        out[slot] = [[landmark.x, landmark.y, landmark.z] for landmark in hand_landmarks.landmark]
+        mask[slot] = True
+        if handedness is not None:
+            handedness[detection] = label
+
+def sample_frame_indices(frame_count, fps, max_frames=200, stride=None, target_fps=None, num_frames=None):
+    """ Source frame indices to run Mediapipe Hands on, at most max_frames of them.
+
+    By default every frame is used. stride keeps every stride-th frame, target_fps keeps
+    frames closest to that rate, and num_frames spreads that many frames uniformly over the
+    whole video (this one needs the frame count). Indices past the end of the video are
+    simply never reached.
+    """
+    if num_frames is not None and frame_count > 0:
+        indices = np.unique(np.linspace(0, frame_count - 1, num_frames).round().astype(np.int64))
+        return indices[:max_frames]
+
+    step = 1.0
+    if stride is not None:
+        step = float(stride)
+    elif target_fps is not None and fps > 0:
+        step = fps / target_fps
+    step = max(step, 1.0)
+    return np.unique(np.floor(np.arange(max_frames) * step).astype(np.int64))
+
+def iter_sampled_frames(cap, indices):
+    """ Yield (index, frame) for the given sorted source frame indices of an open capture.
+
+    Frames in between are only grabbed, so they skip retrieve()'s conversion to a BGR
+    image and never reach cvtColor or Mediapipe.
+    """
+    position = 0
+    for index in indices:
+        while position < index:
+            if not cap.grab():
+                return
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield int(index), frame
+
+def extract_video_keypoints(video_path, hands, max_frames=200, frames_dir=None, sampling=None, inference=None):
+    """ Decode a video once and run Mediapipe Hands on its frames, up to max_frames.
+
+    Returns a dict with 'keypoints' ([F, 2, 21, 3] float32, Left/Right slots), 'mask'
+    ([F, 2] bool, True where the hand was detected), 'handedness' ([F, 2] int8, see
+    results_to_array()), 'frame_indices' ([F] source frame
+    index of each row), 'fps' and 'inference_ms' (time spent in hands.process). sampling
+    is a dict of sample_frame_indices() options (stride, target_fps or num_frames); by
+    default every frame is used. If frames_dir is given, frames with the landmarks drawn
+    on are also written there as JPEGs, the same way convert() does, as a side output.
+    inference is a dict of InferenceInput options (max_size, crop) to run Mediapipe on
+    smaller images; landmarks stay in frame coordinates.
+    """
+    hands.reset()  # Drop tracking state from the previous video so results only depend on this one
+    inference_input = InferenceInput(**(inference or {}))
+    cap = cv2.VideoCapture(video_path)
+    frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    indices = sample_frame_indices(frameCount, fps, max_frames, **(sampling or {}))
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    keypoints = []
+    mask = []
+    handedness = []
+    frame_indices = []
+    lastFrame = None
+    inference_s = 0.0
+
+    if frames_dir is not None:
+        os.makedirs(frames_dir, exist_ok=True)
+
+    for index, frame in iter_sampled_frames(cap, indices):
+        frame_rgb = inference_input.prepare(frame)  # Mediapipe expects RGB
+        start = time.perf_counter()
+        results = hands.process(frame_rgb)
+        inference_s += time.perf_counter() - start
+        inference_input.to_frame(results)
+
+        frame_keypoints = np.zeros((2, NUM_LANDMARKS, 3), dtype=np.float32)
+        frame_mask = np.zeros(2, dtype=bool)
+        frame_handedness = np.zeros(2, dtype=np.int8)
+        results_to_array(results, frame_keypoints, frame_mask, frame_handedness)
+        keypoints.append(frame_keypoints)
+        mask.append(frame_mask)
+        handedness.append(frame_handedness)
+        frame_indices.append(index)
+
+        if frames_dir is not None:
+            framename = os.path.join(frames_dir, f"{video_name}_frame_{index}.jpeg")
+            if results.multi_hand_landmarks:
+                for hand_landmarks in results.multi_hand_landmarks:
+                    mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+                lastFrame = frame
+                cv2.imwrite(framename, frame)
+            elif lastFrame is not None:
+                cv2.imwrite(framename, lastFrame)  # Save last valid frame if no hands are detected
+
+    cap.release()
+
+    result = {'frame_indices': np.array(frame_indices, dtype=np.int32), 'fps': np.float64(fps),
+              'inference_ms': np.float64(inference_s * 1000)}
+    if keypoints:
+        result['keypoints'] = np.stack(keypoints)
+        result['mask'] = np.stack(mask)
+        result['handedness'] = np.stack(handedness)
+    else:
+        result['keypoints'] = np.zeros((0, 2, NUM_LANDMARKS, 3), dtype=np.float32)
+        result['mask'] = np.zeros((0, 2), dtype=bool)
+        result['handedness'] = np.zeros((0, 2), dtype=np.int8)
+    return result
+
+def list_videos(dataset_folder):
+    """ List (category, gesture, video_path) for every video under dataset_folder, in sorted order.
+
+    Comes from the dataset catalog, so only new or changed videos are probed.
+    """
+    return load_catalog(dataset_folder).videos()
+
+def _init_worker(max_num_hands, min_detection_confidence):
+    """ Give each pool worker its own Mediapipe Hands instance. """
+    global _worker_hands
+    _worker_hands = create_hands(max_num_hands, min_detection_confidence)
+
+def _extract_in_worker(job):
+    video_path, max_frames, frames_dir, sampling, inference = job
+    return extract_video_keypoints(video_path, _worker_hands, max_frames, frames_dir, sampling, inference)
+
+def iter_dataset(dataset_folder, frames_folder=None, max_frames=200, max_num_hands=2,
+                 min_detection_confidence=0.5, workers=1, cache_dir=None, cache_max_bytes=None, sampling=None,
+                 inference=None):
+    """ Yield (category, gesture, video, result) for every video, one video at a time.
+
+    With workers > 1 the videos are spread over a process pool, one Hands instance per
+    worker. Results are still yielded in the sorted order of list_videos(), and since
+    every video starts from a fresh tracking state the output matches the serial run.
+
+    sampling picks which frames are used, see sample_frame_indices(), and inference the
+    Mediapipe input size, see InferenceInput.
+
+    With cache_dir set, results are cached per video as soon as they are extracted, so a
+    re-run only processes new or changed videos (cached videos do not re-export frames).
+    """
+    videos = list_videos(dataset_folder)
+    cache = None
+    keys = [None] * len(videos)
+    cached = [False] * len(videos)
+    if cache_dir is not None:
+        cache = ExtractionCache(cache_dir, cache_max_bytes)
+        params = extraction_params(max_frames, max_num_hands, min_detection_confidence, sampling, inference)
+        for i, (category, gesture, video_path) in enumerate(videos):
+            keys[i] = cache.key(video_path, params)
+            cached[i] = cache.contains(keys[i])  # Only loaded when its turn comes, one video at a time
+        cache.save()
+
+    def job(category, gesture, video_path):
+        frames_dir = None
+        if frames_folder is not None:
+            frames_dir = os.path.join(frames_folder, category, gesture)
+        return video_path, max_frames, frames_dir, sampling, inference
+
+    jobs = [job(*video) for video, is_cached in zip(videos, cached) if not is_cached]
+
+    executor = None
+    if workers > 1 and jobs:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(max_num_hands, min_detection_confidence))
+        extracted = executor.map(_extract_in_worker, jobs)
+    else:
+        extracted = _extract_serial(jobs, max_num_hands, min_detection_confidence)
+
+    try:
+        for (category, gesture, video_path), key, is_cached in zip(videos, keys, cached):
+            if is_cached:
+                result = cache.get(key)
+                from_cache = result is not None
+                if result is None:
+                    # Evicted or unreadable since the check, extract it here instead
+                    result = next(_extract_serial([job(category, gesture, video_path)], max_num_hands,
+                                                  min_detection_confidence))
+                    cache.put(key, result)
+            else:
+                from_cache = False
+                result = next(extracted)
+                if cache is not None:
+                    cache.put(key, result)
+            if metrics.enabled:
+                metrics.count('videos_cached' if from_cache else 'videos_extracted')
+                metrics.count('frames_decoded', len(result['mask']))
+                # A cache hit runs no inference, the stored inference_ms is from the original extraction
+                metrics.record_video(video_path, category=category, gesture=gesture, cached=from_cache,
+                                     frames_decoded=len(result['mask']),
+                                     frames_with_hands=int(result['mask'].any(axis=1).sum()),
+                                     inference_ms=0.0 if from_cache else float(result.get('inference_ms', 0.0)))
+            yield category, gesture, os.path.basename(video_path), result
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        else:
+            extracted.close()
+
+def _extract_serial(jobs, max_num_hands, min_detection_confidence):
+    if not jobs:
+        return
+    hands = create_hands(max_num_hands, min_detection_confidence)
+    try:
+        for video_path, max_frames, frames_dir, sampling, inference in jobs:
+            yield extract_video_keypoints(video_path, hands, max_frames, frames_dir, sampling, inference)
+    finally:
+        hands.close()
+
+def extract_dataset(dataset_folder, frames_folder=None, max_frames=200, max_num_hands=2,
+                    min_detection_confidence=0.5, workers=1, cache_dir=None, sampling=None, inference=None):
+    """ Extract keypoints for the whole videos/ tree as {category: {gesture: {video: result}}}. """
+    dataset = {}
+    for category, gesture, video, result in iter_dataset(dataset_folder, frames_folder, max_frames, max_num_hands,
+                                                         min_detection_confidence, workers, cache_dir,
+                                                         sampling=sampling, inference=inference):
+        dataset.setdefault(category, {}).setdefault(gesture, {})[video] = result
+    return dataset
+
+def main():
+    dataset_folder = r"D:\FINAL_YEAR_PROJECT\Gesture2Speech\videos"  # Folder containing categories like 'Adjectives', 'Pronouns', 'Places'
+    workers = os.cpu_count() or 1  # Number of extraction processes, 1 runs serially
+    cache_dir = 'extraction_cache'  # Re-runs only extract new or changed videos
+    store_path = 'keypoints_store'
+    write_store(store_path, iter_dataset(dataset_folder, workers=workers, cache_dir=cache_dir))
+    print(f"Extraction complete. Keypoints saved to '{store_path}'.")
+
+    # JSON copy in the layout of keypoints1.json, for scripts that still read it
+    export_json(KeypointStore(store_path), 'keypoints1.json')
+    export_metrics()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import os
+import time
+import argparse
+import numpy as np
+from keypoint_store import KeypointStore
+from quantization import QUANTIZATIONS, quantized_arrays
+from shards import ShardWriter
+
+def video_labels(store):
+    """ Class id of every video in a keypoint store, one class per (category, gesture), and the class names. """
+    names = [f"{entry['category']}/{entry['gesture']}" for entry in store.videos]
+    classes, labels = np.unique(np.array(names, dtype=str), return_inverse=True)
+    return labels.astype(np.int32), list(classes)
+
+def _shuffled_by_class(labels, rng):
+    """ Yield the video indices of each class, in class order and shuffled within the class. """
+    order = np.argsort(labels, kind='stable')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    for members in np.split(order, bounds) if len(order) else []:
+        yield rng.permutation(members)
+
+def stratified_split(labels, train_ratio=0.8, seed=0):
+    """ Split video indices into (train, test) with the same class proportions in both.
+
+    Whole videos are assigned, so no frames of a clip end up on both sides. Every class with
+    at least two videos keeps one on each side. The indices come back sorted.
+    """
+    rng = np.random.default_rng(seed)
+    train, test = [], []
+    for members in _shuffled_by_class(np.asarray(labels), rng):
+        n_train = int(round(len(members) * train_ratio))
+        if len(members) > 1:
+            n_train = min(max(n_train, 1), len(members) - 1)
+        train.append(members[:n_train])
+        test.append(members[n_train:])
+    return (np.sort(np.concatenate(train or [[]])).astype(np.int32),
+            np.sort(np.concatenate(test or [[]])).astype(np.int32))
+
+def stratified_kfold(labels, k=5, seed=0):
+    """ Split video indices into k folds with the same class proportions. Returns k (train, test) pairs.
+
+    The videos of each class are shuffled and dealt round-robin over the folds, continuing
+    where the previous class stopped, so fold sizes differ by at most one video.
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.asarray(labels)
+    fold = np.empty(len(labels), dtype=np.int32)
+    dealt = 0
+    for members in _shuffled_by_class(labels, rng):
+        fold[members] = (dealt + np.arange(len(members))) % k
+        dealt += len(members)
+    return [(np.flatnonzero(fold != i).astype(np.int32), np.flatnonzero(fold == i).astype(np.int32))
+            for i in range(k)]
+
+def save_split(path, train, test, seed, videos):
+    """ Write a split as a small .npz of index arrays, atomically. videos is the store's video count. """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, train=train, test=test, seed=seed, videos=videos)
+    os.replace(tmp_path, path)
+
+def load_split(path, store=None):
+    """ Load (train, test) index arrays, checking them against the store they were made for if given. """
+    with np.load(path) as split:
+        train, test, videos = split['train'], split['test'], int(split['videos'])
+    if store is not None and len(store) != videos:
+        raise ValueError(f"split '{path}' was made for {videos} videos, the store has {len(store)}")
+    return train, test
+
+def write_splits(store_path, output_dir, train_ratio=0.8, folds=0, seed=0):
+    """ Write split.npz and, with folds > 1, fold<i>.npz index files for a keypoint store. Returns the paths. """
+    store = KeypointStore(store_path)
+    labels, classes = video_labels(store)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, 'split.npz')]
+    save_split(paths[0], *stratified_split(labels, train_ratio, seed), seed, len(store))
+    if folds > 1:
+        for i, (train, test) in enumerate(stratified_kfold(labels, folds, seed)):
+            paths.append(os.path.join(output_dir, f'fold{i}.npz'))
+            save_split(paths[-1], train, test, seed, len(store))
+    return paths
+
+def write_split_shards(store_path, split_path, output_dir, samples_per_shard=256, workers=4, quantization=None):
+    """ Pack the train and test videos of a split into compressed shards, one sample per video.
+
+    quantization ('float16' or 'uint16') stores the keypoints in 2 bytes per value, see
+    quantization.dequantized_array().
+    """
+    store = KeypointStore(store_path)
+    for split_type, indices in zip(('train', 'test'), load_split(split_path, store)):
+        with ShardWriter(os.path.join(output_dir, split_type), samples_per_shard, workers) as writer:
+            for i in indices:
+                entry = store.videos[i]
+                keypoints, mask = store[i]
+                writer.add(f"{entry['category']}/{entry['gesture']}", entry['video'], mask=mask,
+                           frame_indices=store.frame_indices(i), **quantized_arrays('keypoints', keypoints, quantization))
+
+def main():
+    parser = argparse.ArgumentParser(description="Video-level stratified train/test split of a keypoint store.")
+    parser.add_argument('store', help="keypoint store to split")
+    parser.add_argument('output', help="folder for the index files")
+    parser.add_argument('--train-ratio', type=float, default=0.8)
+    parser.add_argument('--folds', type=int, default=0, help="also write k cross-validation folds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shards', help="also pack the train/test videos of split.npz into shards in this folder")
+    parser.add_argument('--quantization', choices=QUANTIZATIONS, help="store the keypoints of the shards in 2 bytes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = write_splits(args.store, args.output, args.train_ratio, args.folds, args.seed)
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"Wrote {len(paths)} index files ({size / 1024:.1f} KB) to '{args.output}' in {elapsed * 1000:.1f} ms.")
+    if args.shards:
+        write_split_shards(args.store, paths[0], args.shards, quantization=args.quantization)
+        print(f"Shards saved to '{args.shards}'.")
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,16 @@
 import cv2
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from imgaug import augmenters as iaa
+from imgaug import augmenters as iaa  # imgaug 0.4.0 needs numpy<2 (it uses np.sctypes, removed in NumPy 2)
 
-# Path to the videos directory
-base_path = 'D:\FINAL_YEAR_PROJECT\Gesture2Speech\videos'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataPreProcessing'))
+from catalog import load_catalog
 
-# Define label mapping based on folder structure
-label_mapping = {
-    "he": 0, "i": 1, "she": 2, "they": 3, "we": 4, "you": 5,
-    "clean": 6, "dirty": 7, "strong": 8, "weak": 9,
-    "boy": 10, "girl": 11,
-    "hospital": 12, "house": 13, "school": 14, "university": 15,
-}
+# Path to the videos directory
+base_path = r'D:\FINAL_YEAR_PROJECT\Gesture2Speech\videos'
+frames_path = r'D:\FINAL_YEAR_PROJECT\Gesture2Speech\frames'
 
 # Augmentation sequence
 seq = iaa.Sequential([
@@ -42,28 +40,82 @@ seq = iaa.Sequential([
     )
 ], random_order=True) # apply augmenters in random order
 
-def process_videos(base_path):
-    # Loop through each category folder
-    for category in os.listdir(base_path):
-        category_path = os.path.join(base_path, category)
-        # Loop through each video file
-        for video_name in os.listdir(category_path):
-            video_path = os.path.join(category_path, video_name)
-            # Extract frames
-            cap = cv2.VideoCapture(video_path)
-            frame_count = 0
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                # Frame operations
+def make_clip_augmenter(rng):
+    """ Sample one fixed transform from the ranges of seq, to apply the same way to every frame of a clip.
+
+    seq samples new parameters for every image, so a clip augmented with it gets a
+    different flip, crop and rotation on every frame. Here the parameters are drawn
+    once; only the gaussian noise stays random per frame.
+    """
+    augmenters = []
+    if rng.random() < 0.5:
+        augmenters.append(iaa.Fliplr(1.0))  # horizontal flip
+    augmenters.append(iaa.Crop(percent=tuple(rng.uniform(0, 0.1, 4)), keep_size=True))  # top, right, bottom, left
+    if rng.random() < 0.5:
+        augmenters.append(iaa.GaussianBlur(sigma=rng.uniform(0, 0.5)))
+    augmenters.append(iaa.LinearContrast(rng.uniform(0.75, 1.5)))
+    augmenters.append(iaa.AdditiveGaussianNoise(loc=0, scale=rng.uniform(0.0, 0.03*255), per_channel=rng.random() < 0.5))
+    if rng.random() < 0.2:
+        # One multiplier per channel, which can change the colour of the clip
+        augmenters.append(iaa.Sequential([iaa.WithChannels(channel, iaa.Multiply(mul))
+                                          for channel, mul in enumerate(rng.uniform(0.8, 1.2, 3))]))
+    else:
+        augmenters.append(iaa.Multiply(rng.uniform(0.8, 1.2)))
+    augmenters.append(iaa.Affine(
+        scale={"x": rng.uniform(0.8, 1.2), "y": rng.uniform(0.8, 1.2)},
+        translate_percent={"x": rng.uniform(-0.2, 0.2), "y": rng.uniform(-0.2, 0.2)},
+        rotate=rng.uniform(-25, 25),
+        shear=rng.uniform(-8, 8)
+    ))
+    order = rng.permutation(len(augmenters))  # apply augmenters in random order, fixed for the clip
+    return iaa.Sequential([augmenters[i] for i in order])
+
+def augment_video(video_path, save_prefix, seed, video_index, clips_per_transform=1, batch_size=32):
+    """ Augment all frames of one video with a single transform, a batch of frames per imgaug call.
+
+    The transform depends only on (seed, video_index // clips_per_transform), so runs are
+    reproducible and do not depend on which worker processes the video. Returns the frame count.
+    """
+    clip_aug = make_clip_augmenter(np.random.default_rng([seed, video_index // clips_per_transform]))
+    clip_aug.seed_(int(np.random.default_rng([seed, video_index]).integers(2**31)))  # Per-frame noise
+    cap = cv2.VideoCapture(video_path)
+    frame_count = 0
+    batch = []
+    while True:
+        ret, frame = cap.read()
+        if ret:
+            batch.append(cv2.resize(frame, (224, 224)))  # Resize frame to 224x224
+        if batch and (len(batch) == batch_size or not ret):
+            images_aug = clip_aug(images=batch)  # Apply augmentation
+            for image in images_aug:
                 frame_count += 1
-                frame = cv2.resize(frame, (224, 224))  # Resize frame to 224x224
-                images_aug = seq(images=[frame])  # Apply augmentation
-                label = label_mapping[category]  # Get label from folder name
-                # Save frame
-                save_path = os.path.join('D:\FINAL_YEAR_PROJECT\Gesture2Speech\frames', f"{category}_{video_name}_{frame_count}.png")
-                cv2.imwrite(save_path, images_aug[0])
-            cap.release()
+                cv2.imwrite(f"{save_prefix}_{frame_count}.png", image)
+            batch = []
+        if not ret:
+            break
+    cap.release()
+    return frame_count
+
+def _augment_job(job):
+    return augment_video(*job)
+
+def list_augmentation_jobs(base_path, output_path, seed=0, clips_per_transform=1, batch_size=32):
+    """ One (video, save prefix, seed, index, ...) job per video, in sorted order so indices are stable. """
+    jobs = []
+    # Every video of the <gesture>/<video> layout, from the dataset catalog
+    catalog = load_catalog(base_path, levels=1)
+    for entry in catalog:
+        category, video_name = entry['gesture'], entry['video']
+        save_prefix = os.path.join(output_path, f"{category}_{video_name}")
+        jobs.append((catalog.video_path(entry), save_prefix, seed, len(jobs), clips_per_transform, batch_size))
+    return jobs
+
+def process_videos(base_path, output_path=frames_path, workers=1, seed=0, clips_per_transform=1, batch_size=32):
+    jobs = list_augmentation_jobs(base_path, output_path, seed, clips_per_transform, batch_size)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(_augment_job, jobs))
+    return sum(augment_video(*job) for job in jobs)
 
-process_videos(base_path)
+if __name__ == '__main__':
+    process_videos(base_path, workers=os.cpu_count() or 1)
@@ -1,107 +1,113 @@
 import cv2
 import os
+import sys
 from os.path import join, exists
 import mediapipe as mp
 from tqdm import tqdm
 
-hc = []  # For tracking frame info
+sys.path.insert(0, join(os.path.dirname(os.path.abspath(__file__)), 'dataPreProcessing'))
+from catalog import load_catalog
+from inference_input import InferenceInput
+from instrumentation import export_metrics, metrics
+from video_keypoints import iter_sampled_frames, sample_frame_indices
 
 # Initialize Mediapipe Hands
 mp_hands = mp.solutions.hands
 hands = mp_hands.Hands(static_image_mode=False, max_num_hands=2, min_detection_confidence=0.5)
 mp_drawing = mp.solutions.drawing_utils  # For drawing landmarks
 
-def convert(dataset_folder, target_folder):
-    rootPath = os.getcwd()  # Save current working directory
+def process_frame(frame, lastFrame, inference_input):
+    """ Run Mediapipe on one frame and pick the image to save for it.
+
+    Returns (image or None, new lastFrame, hands found, seconds in hands.process).
+    """
+    # Use Mediapipe Hands to detect keypoints
+    frame_rgb = inference_input.prepare(frame)  # Convert to RGB (and maybe shrink) for Mediapipe
+    with metrics.timer('hands_process_seconds') as timer:
+        results = hands.process(frame_rgb)
+    inference_input.to_frame(results)  # Landmarks back in full-frame coordinates for drawing
+
+    if results.multi_hand_landmarks:
+        # Draw hand landmarks on the frame for visualization (optional)
+        for hand_landmarks in results.multi_hand_landmarks:
+            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
+        return frame, frame, True, timer.seconds  # Save frame with keypoints drawn
+    # Save last valid frame if no hands are detected
+    return lastFrame, lastFrame, False, timer.seconds
+
+def list_convert_jobs(catalog, majorData, sampling):
+    """ One dict per video with its paths and the source frames to export. """
+    jobs = []
+    for entry in catalog:
+        gesture_frames_path = join(majorData, entry['category'], entry['gesture'])  # Path to save frames
+        os.makedirs(gesture_frames_path, exist_ok=True)
+        jobs.append({'category': entry['category'], 'gesture': entry['gesture'], 'path': catalog.video_path(entry),
+                     'prefix': join(gesture_frames_path, os.path.splitext(entry['video'])[0]),
+                     'frameCount': entry['frames'],
+                     'frame_indices': sample_frame_indices(entry['frames'], entry['fps'], 200, **sampling)})
+    return jobs
+
+def record_converted_video(job, frames_decoded, frames_with_hands, inference_s, bytes_written):
+    metrics.count('frames_decoded', frames_decoded)
+    metrics.count('frames_with_hands', frames_with_hands)
+    metrics.record_video(job['path'], category=job['category'], gesture=job['gesture'], frames_decoded=frames_decoded,
+                         frames_with_hands=frames_with_hands, inference_ms=inference_s * 1000,
+                         bytes_written=bytes_written)
+
+def convert(dataset_folder, target_folder, stride=None, target_fps=None, num_frames=None, inference_size=None,
+            crop=False):
+    # Optional temporal sampling: keep every stride-th frame, frames at target_fps, or
+    # num_frames spread over the video. Skipped frames are only grabbed, never decoded to BGR.
+    # inference_size / crop run Mediapipe on smaller images (or hand crops), see InferenceInput.
+    inference_input = InferenceInput(inference_size, crop)
+    sampling = {'stride': stride, 'target_fps': target_fps, 'num_frames': num_frames}
     majorData = os.path.abspath(target_folder)  # Target folder to save frames
     
     if not exists(majorData):
         os.makedirs(majorData)
 
-    dataset_folder = os.path.abspath(dataset_folder)
+    # Every video with its frame count and FPS, only new or changed videos are probed
+    catalog = load_catalog(dataset_folder)
 
-    print(f"Source Directory containing gesture categories: {dataset_folder}")
+    print(f"Source Directory containing gesture categories: {catalog.dataset_folder}")
     print(f"Destination Directory for frames: {majorData}\n")
 
-    # Iterate over categories (pronouns, adjectives, places, etc.)
-    for category in tqdm(os.listdir(dataset_folder), unit='categories', ascii=True):
-        category_path = join(dataset_folder, category)  # Path to the category folder
-        os.chdir(category_path)
-
-        # Iterate over gestures in each category
-        for gesture in tqdm(os.listdir(category_path), unit='gestures', ascii=True):
-            gesture_path = join(category_path, gesture)  # Path to gesture folder
-            os.chdir(gesture_path)
-
-            gesture_frames_path = join(majorData, category, gesture)  # Path to save frames
-            if not os.path.exists(gesture_frames_path):
-                os.makedirs(gesture_frames_path)
-
-            videos = [video for video in os.listdir(gesture_path) if os.path.isfile(video)]
-
-            # Process each video
-            for video in tqdm(videos, unit='videos', ascii=True):
-                video_path = os.path.abspath(video)
-                cap = cv2.VideoCapture(video_path)  # Capture video
-                frameCount = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                fps = int(cap.get(cv2.CAP_PROP_FPS))
-                if fps != 0:
-                    duration = frameCount / fps
-                else:
-                    duration = 0
-                lastFrame = None
-                count = 0  # Frame counter
-
-                print(f"Processing video: {video_path} (Total Frames: {frameCount})")
-
-                os.chdir(gesture_frames_path)
-
-                while count < 200:
-                    ret, frame = cap.read()  # Read frame
-                    if not ret:
-                        break
-
-                    framename = os.path.splitext(video)[0] + f"_frame_{count}.jpeg"
-                    hc.append([join(gesture_frames_path, framename), category, gesture, frameCount])
-
-                    # Use Mediapipe Hands to detect keypoints
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)  # Convert to RGB for Mediapipe
-                    results = hands.process(frame_rgb)
-
-                    if results.multi_hand_landmarks:
-                        # Draw hand landmarks on the frame for visualization (optional)
-                        for hand_landmarks in results.multi_hand_landmarks:
-                            mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
-
-                        lastFrame = frame
-                        cv2.imwrite(framename, frame)  # Save frame with keypoints drawn
-                    else:
-                        if lastFrame is not None:
-                            cv2.imwrite(framename, lastFrame)  # Save last valid frame if no hands are detected
-
-                    count += 1
-
-                    if count >= 200:
-                        while count < frameCount:
-                            cv2.imwrite(framename, lastFrame)
-                            count += 1
-                        break
-
-                cap.release()  # Release video capture
-                cv2.destroyAllWindows()  # Close OpenCV windows
-
-            os.chdir(category_path)  # Go back to category folder
-
-        os.chdir(dataset_folder)  # Go back to dataset folder
-
-    os.chdir(rootPath)  # Return to root path
+    # Process each video, all paths are absolute so the working directory never changes
+    for job in tqdm(list_convert_jobs(catalog, majorData, sampling), unit='videos', ascii=True):
+        cap = cv2.VideoCapture(job['path'])  # Capture video
+        inference_input.reset()
+        lastFrame = None
+        frames_decoded = 0
+        frames_with_hands = 0
+        inference_s = 0.0
+        bytes_written = 0
+
+        print(f"Processing video: {job['path']} (Total Frames: {job['frameCount']})")
+
+        for index, frame in iter_sampled_frames(cap, job['frame_indices']):
+            # Name frames by their source index so sampled frames keep their real timing
+            framename = job['prefix'] + f"_frame_{index}.jpeg"
+            frames_decoded += 1
+
+            image, lastFrame, found, seconds = process_frame(frame, lastFrame, inference_input)
+            frames_with_hands += found
+            inference_s += seconds
+            if image is not None:
+                cv2.imwrite(framename, image)
+            if metrics.enabled and os.path.exists(framename):
+                bytes_written += os.path.getsize(framename)
+
+        cap.release()  # Release video capture
+        cv2.destroyAllWindows()  # Close OpenCV windows
+        record_converted_video(job, frames_decoded, frames_with_hands, inference_s, bytes_written)
 
 if __name__ == '__main__':
     dataset_folder = r'D:\FINAL_YEAR_PROJECT\Gesture2Speech\videos'
     target_folder = r'D:\FINAL_YEAR_PROJECT\Gesture2Speech\frames'
     convert(dataset_folder, target_folder) # Folder where extracted frames will be saved
+    export_metrics()
     
-    '''code creates 200 frames but with repeating static frames last repeated'''
+    '''code saves at most 200 frames per video; fixed-length sequences come from resampling.py instead of repeated frames'''
 # import cv2
 # import os
 # from os.path import join, exists
@@ -0,0 +1,389 @@
+import os
+import sys
+import math
+import time
+import wave
+import queue
+import argparse
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dataPreProcessing'))
+from keypoint_store import FRAME_SHAPE, KeypointStore
+from labels import label_mapping, label_names
+from normalization import FrameNormalizer, normalize_hands
+from segmentation import GestureSegmenter
+from dtw_index import DTWIndex
+from sequence_classifier import SequenceClassifier
+from video_keypoints import create_hands, results_to_array
+
+def open_source(source, pace=True):
+    """ Yield (arrival_time, frame) from a webcam index or a video file.
+
+    Video files are replayed at their native FPS when pace is True, so a recorded clip
+    behaves like a camera and the engine can be tested without one.
+    """
+    is_camera = isinstance(source, int) or str(source).isdigit()
+    cap = cv2.VideoCapture(int(source) if is_camera else source)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video source {source!r}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    pace = pace and not is_camera  # A camera already delivers frames in real time
+    start = time.perf_counter()
+    count = 0
+    try:
+        while True:
+            if pace:
+                delay = start + count / fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield time.perf_counter(), frame
+            count += 1
+    finally:
+        cap.release()
+
+class LandmarkRingBuffer:
+    """ Preallocated ring buffer of the last `capacity` frames of [2, 21, 3] landmarks and hand masks.
+
+    `normalized` has a float64 slot per frame for callers that normalize frames as they arrive.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.keypoints = np.zeros((capacity,) + FRAME_SHAPE, dtype=np.float32)
+        self.mask = np.zeros((capacity, 2), dtype=bool)
+        self.normalized = np.zeros((capacity,) + FRAME_SHAPE, dtype=np.float64)
+        self.count = 0  # Frames pushed so far
+        self._offsets = np.arange(capacity)
+
+    def next_slot(self):
+        """ Return (keypoints, mask) views of the slot the next frame is written to. """
+        slot = self.count % self.capacity
+        return self.keypoints[slot], self.mask[slot]
+
+    def next_normalized_slot(self):
+        """ Return the normalized view of the slot the next frame is written to. """
+        return self.normalized[self.count % self.capacity]
+
+    def advance(self):
+        self.count += 1
+
+    def window(self, length, out_keypoints, out_mask, out_normalized=None, end=None):
+        """ Copy the `length` frames before frame number `end` (the newest frame if None), oldest first. """
+        end = self.count if end is None else end
+        indices = (self._offsets[:length] + (end - length)) % self.capacity
+        np.take(self.keypoints, indices, axis=0, out=out_keypoints)
+        np.take(self.mask, indices, axis=0, out=out_mask)
+        if out_normalized is not None:
+            np.take(self.normalized, indices, axis=0, out=out_normalized)
+
+def window_features(keypoints, mask, normalized=None):
+    """ Feature vector of a [T, 2, 21, 3] window: mean normalized hand shape plus how often each hand is seen.
+
+    normalized, if given, is normalize_hands(keypoints), e.g. built frame by frame with FrameNormalizer.
+    """
+    if normalized is None:
+        normalized = normalize_hands(keypoints)
+    normalized = normalized * mask[..., None, None]
+    return np.concatenate([normalized.mean(axis=0).ravel(), mask.mean(axis=0)])
+
+class CentroidClassifier:
+    """ Nearest-centroid classifier over window_features(), one centroid per gesture in label_mapping. """
+
+    def __init__(self, centroids, labels):
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.labels = np.asarray(labels)
+
+    @classmethod
+    def from_store(cls, store_path):
+        """ Build the centroids from a keypoint store of the training videos. """
+        features = {}
+        for category, gesture, video, keypoints, mask in KeypointStore(store_path).iter_videos():
+            if gesture not in label_mapping or not mask.any():
+                continue
+            features.setdefault(label_mapping[gesture], []).append(window_features(keypoints, mask))
+        labels = sorted(features)
+        if not labels:
+            raise ValueError(f"No videos of a known gesture in {store_path}")
+        return cls([np.mean(features[label], axis=0) for label in labels], labels)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as model:
+            return cls(model['centroids'], model['labels'])
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, labels=self.labels)
+
+    def __call__(self, keypoints, mask, normalized=None):
+        """ Return (label index, score) for a [T, 2, 21, 3] window and its [T, 2] mask. """
+        distances = ((self.centroids - window_features(keypoints, mask, normalized)) ** 2).sum(axis=1)
+        weights = np.exp(distances.min() - distances)
+        best = int(np.argmin(distances))
+        return int(self.labels[best]), float(weights[best] / weights.sum())
+
+def load_classifier(path):
+    """ Load a saved CentroidClassifier, SequenceClassifier or DTWIndex .npz, whichever the archive holds. """
+    with np.load(path) as model:
+        files = model.files
+    if 'w1' in files:
+        return SequenceClassifier.load(path)
+    if 'templates' in files:
+        return DTWIndex.load(path)
+    return CentroidClassifier.load(path)
+
+class WavSynthesizer:
+    """ Local stand-in for a speech engine: writes one WAV file per utterance, a short tone per letter. """
+
+    def __init__(self, output_dir='speech_output', sample_rate=16000, tone_seconds=0.06):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.tone_seconds = tone_seconds
+        self.count = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def speak(self, text):
+        samples_per_tone = int(self.sample_rate * self.tone_seconds)
+        t = np.arange(samples_per_tone) / self.sample_rate
+        tones = [np.sin(2 * math.pi * (300 + 20 * (ord(ch) % 32)) * t) for ch in text]
+        audio = (np.concatenate(tones) * 0.3 * 32767).astype('<i2') if tones else np.zeros(0, dtype='<i2')
+
+        path = os.path.join(self.output_dir, f"{self.count:04d}_{text}.wav")
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(self.sample_rate)
+            f.writeframes(audio.tobytes())
+        self.count += 1
+        return path
+
+class Pyttsx3Synthesizer:
+    """ Speaks through the system voice with pyttsx3, if it is installed. """
+
+    def __init__(self):
+        import pyttsx3  # Fail early if it is missing
+        self._pyttsx3 = pyttsx3
+        # pyttsx3 drivers are not thread-safe, so the engine is created on the thread that speaks
+        self.engine = None
+
+    def speak(self, text):
+        if self.engine is None:
+            self.engine = self._pyttsx3.init()
+        self.engine.say(text)
+        self.engine.runAndWait()
+
+SYNTHESIZERS = {'wav': WavSynthesizer, 'pyttsx3': Pyttsx3Synthesizer}
+
+class GestureToSpeech:
+    """ Classify gestures on a live frame stream and speak each newly recognised one.
+
+    Landmarks of the last `window` frames are kept in a ring buffer, and every `stride`
+    frames the window is classified. A label is spoken once it wins `stable` windows in
+    a row with at least `min_score`. The same label is not spoken twice in a row unless a
+    window without hands came in between, or the label did not win any window for
+    `repeat_after` seconds, so a sign repeated after a pause is spoken again. Speech runs
+    on a background thread so the synthesizer never delays the next frame. Latencies and
+    events only keep the last `history` entries, so a long-running camera loop uses
+    constant memory.
+
+    With a segmenter (segmentation.GestureSegmenter) there is no sliding window: each
+    gesture segment is classified once when it ends, and spoken if it reaches min_score.
+    """
+
+    def __init__(self, classifier, synthesizer=None, window=30, stride=5, min_score=0.5, stable=2,
+                 hands=None, on_event=None, segmenter=None, repeat_after=3.0, history=1000):
+        self.classifier = classifier
+        self.window = window
+        self.stride = stride
+        self.min_score = min_score
+        self.stable = stable
+        self.repeat_after = repeat_after
+        self.on_event = on_event
+        self.hands = hands if hands is not None else create_hands()
+        self.segmenter = segmenter
+        capacity = window if segmenter is None else max(window, segmenter.history)
+        self.buffer = LandmarkRingBuffer(capacity)
+        self._window_keypoints = np.zeros((capacity,) + FRAME_SHAPE, dtype=np.float32)
+        self._window_mask = np.zeros((capacity, 2), dtype=bool)
+        # The centroid features take per-frame normalized hands, so each frame is normalized once
+        # on arrival instead of once for every window it is part of
+        self.normalizer = FrameNormalizer() if isinstance(classifier, CentroidClassifier) else None
+        self._window_normalized = None if self.normalizer is None else np.zeros((capacity,) + FRAME_SHAPE)
+        self._rgb = None
+        self._candidate = None
+        self._candidate_count = 0
+        self._last_spoken = None
+        self._last_spoken_seen = 0.0  # When the last spoken label last won a window
+        self.frame_latencies = deque(maxlen=history)  # Frame arrival -> landmarks in the buffer, seconds
+        self.label_latencies = deque(maxlen=history)  # Frame arrival -> label, seconds
+        self.events = deque(maxlen=history)
+        self.windows = 0  # Totals, the deques above only hold the most recent entries
+        self.event_count = 0
+
+        self._speech_queue = None
+        if synthesizer is not None:
+            self._speech_queue = queue.Queue()
+            self._speech_thread = threading.Thread(target=self._speak_loop, args=(synthesizer,), daemon=True)
+            self._speech_thread.start()
+
+    def _speak_loop(self, synthesizer):
+        while True:
+            text = self._speech_queue.get()
+            if text is None:
+                break
+            synthesizer.speak(text)
+
+    def process_frame(self, frame, arrival=None):
+        """ Run one BGR frame through the engine. Returns a speech event dict, or None. """
+        if arrival is None:
+            arrival = time.perf_counter()
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)  # Reuse one RGB buffer across frames
+        results = self.hands.process(self._rgb)
+
+        keypoints, mask = self.buffer.next_slot()
+        results_to_array(results, keypoints, mask)
+        if self.normalizer is not None:
+            self.normalizer.normalize_into(keypoints, self.buffer.next_normalized_slot())
+        self.buffer.advance()
+        self.frame_latencies.append(time.perf_counter() - arrival)
+
+        if self.segmenter is not None:
+            return self._process_segment(self.segmenter.push(keypoints, mask), arrival)
+
+        if self.buffer.count < self.window or (self.buffer.count - self.window) % self.stride:
+            return None
+        self._load_window(self.window)
+        if not self._window_mask[:self.window].any():
+            self._candidate = None  # No hands in view, nothing to say
+            self._last_spoken = None  # and the next sign may be the last one again
+            return None
+        label, score = self._classify(self.window)
+        latency = time.perf_counter() - arrival
+        self.windows += 1
+        self.label_latencies.append(latency)
+        return self._update(label, score, latency)
+
+    def _process_segment(self, segment, arrival):
+        """ Classify a finished (start, end) segment from the segmenter, or do nothing for None. """
+        if segment is None:
+            return None
+        start, end = segment
+        self._load_window(end - start, end)
+        label, score = self._classify(end - start)
+        latency = time.perf_counter() - arrival
+        self.windows += 1
+        self.label_latencies.append(latency)
+        return self._emit(label, score, latency) if score >= self.min_score else None
+
+    def _load_window(self, length, end=None):
+        """ Copy the `length` buffered frames before frame number `end` (the newest frame if None). """
+        self.buffer.window(length, self._window_keypoints[:length], self._window_mask[:length],
+                           None if self.normalizer is None else self._window_normalized[:length], end)
+
+    def _classify(self, length):
+        """ Classify the first `length` frames loaded by _load_window(). """
+        if self.normalizer is not None:
+            return self.classifier(self._window_keypoints[:length], self._window_mask[:length],
+                                   self._window_normalized[:length])
+        return self.classifier(self._window_keypoints[:length], self._window_mask[:length])
+
+    def _update(self, label, score, latency):
+        now = time.perf_counter()
+        if label == self._last_spoken and score >= self.min_score:
+            if now - self._last_spoken_seen >= self.repeat_after:
+                self._last_spoken = None  # Not seen for a while, this is a new occurrence of the sign
+            else:
+                self._last_spoken_seen = now
+        if score < self.min_score:
+            self._candidate = None
+            return None
+        if label == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate = label
+            self._candidate_count = 1
+        if self._candidate_count < self.stable or label == self._last_spoken:
+            return None
+        return self._emit(label, score, latency)
+
+    def _emit(self, label, score, latency):
+        self._last_spoken = label
+        self._last_spoken_seen = time.perf_counter()
+        event = {'label': label, 'text': label_names[label], 'score': score,
+                 'frame': self.buffer.count - 1, 'latency_ms': latency * 1000}
+        self.events.append(event)
+        self.event_count += 1
+        if self._speech_queue is not None:
+            self._speech_queue.put(event['text'])
+        if self.on_event is not None:
+            self.on_event(event)
+        return event
+
+    def run(self, source, pace=True, max_frames=None):
+        """ Process frames from a source until it ends, then return latency statistics. """
+        for count, (arrival, frame) in enumerate(open_source(source, pace)):
+            if max_frames is not None and count >= max_frames:
+                break
+            self.process_frame(frame, arrival)
+        if self.segmenter is not None:
+            self._process_segment(self.segmenter.flush(), time.perf_counter())  # A gesture still going at the end
+        return self.stats()
+
+    def stats(self):
+        stats = {'frames': self.buffer.count, 'windows': self.windows, 'events': self.event_count}
+        for name, latencies in (('frame', self.frame_latencies), ('label', self.label_latencies)):
+            if latencies:
+                stats[f'{name}_latency_p50_ms'] = float(np.percentile(latencies, 50) * 1000)
+                stats[f'{name}_latency_p95_ms'] = float(np.percentile(latencies, 95) * 1000)
+        return stats
+
+    def close(self):
+        if self._speech_queue is not None:
+            self._speech_queue.put(None)
+            self._speech_thread.join()
+        self.hands.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognise gestures from a camera or video file and speak them.")
+    parser.add_argument('--source', default='0', help="webcam index or video file")
+    parser.add_argument('--store', default='keypoints_store', help="keypoint store of training videos for the classifier")
+    parser.add_argument('--model', help="saved CentroidClassifier, SequenceClassifier or DTWIndex .npz, used instead of --store")
+    parser.add_argument('--synth', choices=sorted(SYNTHESIZERS), default='wav')
+    parser.add_argument('--window', type=int, default=30, help="frames per classified window")
+    parser.add_argument('--stride', type=int, default=5, help="classify every N frames")
+    parser.add_argument('--segment', action='store_true',
+                        help="classify each gesture once when motion stops instead of sliding windows")
+    parser.add_argument('--no-pace', action='store_true', help="replay video files as fast as possible")
+    parser.add_argument('--max-frames', type=int)
+    args = parser.parse_args()
+
+    if args.model:
+        classifier = load_classifier(args.model)
+    else:
+        classifier = CentroidClassifier.from_store(args.store)
+
+    def print_event(event):
+        print(f"frame {event['frame']}: {event['text']} (score {event['score']:.2f}, {event['latency_ms']:.1f} ms)")
+
+    segmenter = GestureSegmenter() if args.segment else None
+    engine = GestureToSpeech(classifier, SYNTHESIZERS[args.synth](), window=args.window, stride=args.stride,
+                             on_event=print_event, segmenter=segmenter)
+    try:
+        stats = engine.run(args.source, pace=not args.no_pace, max_frames=args.max_frames)
+    finally:
+        engine.close()
+
+    for name, value in stats.items():
+        print(f"{name}: {value:.1f}" if isinstance(value, float) else f"{name}: {value}")
+    if stats.get('label_latency_p95_ms', 0) > 100:
+        print("Warning: p95 frame-to-label latency is above the 100 ms target.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataPreProcessing'))
+from quantization import QUANTIZATIONS, check_cases, check_error_bounds
+
+CASES = list(check_cases(np.random.default_rng(0), size=20000))
+
+@pytest.mark.parametrize('quantization', QUANTIZATIONS)
+@pytest.mark.parametrize('name, values, params', CASES, ids=[case[0] for case in CASES])
+def test_error_within_bound(name, values, params, quantization):
+    if params is not None and quantization != 'uint16':
+        pytest.skip("fixed-point params only apply to uint16")
+    error, ratio = check_error_bounds(values, quantization, params)
+    assert ratio <= 1.0, f"{name} {quantization}: max error {error:.3g} is {ratio:.2f}x the bound"